@@ -24,39 +24,22 @@
 
 
 from neuropy3.neuropy3 import MindWave
-from neuropy3.gui import gui
+from neuropy3.recorder import Recorder
+from neuropy3 import server as sv
+
+from neuropy3 import utils as ut
+from threading import Event
 
 import argparse
+import signal
+import time
+import sys
 
+# gui (PySide6) and lsl (pylsl) are imported only when required by
+# arguments, they are heavy to load and unused for plain logging
 
-def main():
-    files = {
-        'raw': None,
-        'att': None,
-        'med': None,
-        'eeg': None
-    }
-
-    def log_raw(data):
-        # Approx. one packet every 2ms
-        files['raw'].write(f'{data}\n')
-        files['raw'].flush()
-
-    def log_att(data):
-        # Approx. one packet every 1s
-        files['att'].write(f'{data}\n')
-        files['att'].flush()
-
-    def log_med(data):
-        # Approx. one packet every 1s
-        files['med'].write(f'{data}\n')
-        files['med'].flush()
-
-    def log_eeg(data):
-        # Approx. one packet every 1s
-        files['eeg'].write(f'{",".join(map(str, data.values()))}\n')
-        files['eeg'].flush()
 
+def main():
     parser = argparse.ArgumentParser(
         prog='python -m neuropy3',
         description=("NeuroSky MindWave Mobile 2 reader."))
@@ -64,8 +47,12 @@ def main():
                         choices=range(5), default=2, type=int,
                         help="Maximum verbose level.")
     parser.add_argument('-r', '--raw', metavar='RAW_FILE',
-                        nargs='?',  const='raw.csv',
+                        nargs='?',  const='',
                         help="Stores raw data in RAW_FILE. Default: raw.csv")
+    parser.add_argument('-c', '--codec', choices=('zlib', 'lzma'),
+                        help=("Stores raw data compressed (delta encoded, "
+                              "seekable blocks) instead of CSV. "
+                              "Default RAW_FILE: raw.rawz"))
     parser.add_argument('-a', '--att', metavar='ATT_FILE',
                         nargs='?',  const='att.csv',
                         help=("Stores attention data in ATT_FILE. "
@@ -77,39 +64,234 @@ def main():
     parser.add_argument('-e', '--eeg', metavar='EEG_FILE',
                         nargs='?',  const='eeg.csv',
                         help="Stores eeg data in EEG_FILE. Default: eeg.csv")
+    parser.add_argument('-S', '--session', metavar='SESSION_FILE',
+                        nargs='?', const='session.np3',
+                        help=("Stores every stream (raw, signal, attention, "
+                              "meditation, blink, eeg) with timestamps in "
+                              "a single SESSION_FILE. Default: session.np3"))
+    parser.add_argument('-p', '--parquet', metavar='PARQUET_FILE',
+                        nargs='?', const='session.parquet',
+                        help=("Stores every stream in a Parquet PARQUET_FILE. "
+                              "Requires neuropy3[parquet]. "
+                              "Default: session.parquet"))
     parser.add_argument('-g', '--gui',
                         action='store_true',
                         help="Graphical interface to represent headset data.")
+    parser.add_argument('--scroll',
+                        action='store_true',
+                        help=("Scrolling raw chart in graphical interface, "
+                              "refreshed at 30 FPS."))
     parser.add_argument('-d', '--address',
                         metavar='bd_address',
-                        help="MindWave Mobile bluetooth device address (MAC).")
+                        help=("MindWave Mobile bluetooth device address (MAC) "
+                              "or transport address: tcp:HOST:PORT, "
+                              "serial:PATH, /dev/rfcommN, file:PATH."))
+    parser.add_argument('--scan',
+                        action='store_true',
+                        help=("Scans and registers every MindWave Mobile "
+                              "in range, then exits."))
+    parser.add_argument('--no-cache',
+                        action='store_true',
+                        help=("Always scans bluetooth devices instead of "
+                              "using known headsets when no address is "
+                              "given."))
+    parser.add_argument('-b', '--batch', metavar='SESSIONS_DIR',
+                        help=("Processes every recorded session of "
+                              "SESSIONS_DIR (microvolts, bands and "
+                              "features) in parallel, then exits."))
+    parser.add_argument('--raw-pattern', metavar='PATTERN',
+                        default='*raw*.csv',
+                        help=("Batch processing CSV files processed as raw "
+                              "recordings, others are skipped. "
+                              "Default: *raw*.csv"))
+    parser.add_argument('--export', metavar='RECORDING', nargs='+',
+                        help=("Exports recordings (.np3, .rawz, .csv, .bin) "
+                              "to Parquet files in OUTPUT_DIR, then exits. "
+                              "Requires neuropy3[parquet]"))
+    parser.add_argument('-o', '--output', metavar='OUTPUT_DIR',
+                        default='processed',
+                        help=("Batch processing and export results. "
+                              "Default: processed"))
+    parser.add_argument('-j', '--jobs', type=int,
+                        help=("Batch processing worker processes. "
+                              "Default: number of CPUs"))
+    parser.add_argument('--reconnect',
+                        action='store_true',
+                        help="Reconnects automatically if connection is lost.")
+    parser.add_argument('-s', '--serve', metavar='SERVER_ADDRESS',
+                        nargs='?', const=sv.ADDRESS,
+                        help=("Streams headset data to local clients "
+                              "(see neuropy3.client). SERVER_ADDRESS: "
+                              "tcp:HOST:PORT or unix:PATH. "
+                              f"Default: {sv.ADDRESS}"))
+    parser.add_argument('-l', '--lsl',
+                        action='store_true',
+                        help=("Publishes headset data as Lab Streaming Layer "
+                              "streams. Requires neuropy3[lsl]"))
+    parser.add_argument('-P', '--pipeline', metavar='CONFIG',
+                        help=("Runs a streaming pipeline from a JSON/YAML "
+                              "config file or spec, e.g. 'raw | microvolts "
+                              "| bands rate=4 | power > file path=power.bin "
+                              "+ tcp'. Stage metrics are shown when stopped. "
+                              "See neuropy3.pipeline"))
+    parser.add_argument('-t', '--trace', metavar='TRACE_FILE',
+                        nargs='?', const='trace.json',
+                        help=("Traces latency of values, from bytes received "
+                              "to pipelines, recordings or GUI. Latency "
+                              "percentiles are shown when stopped, spans are "
+                              "stored as Chrome trace JSON in TRACE_FILE. "
+                              "Default: trace.json"))
+    parser.add_argument('--profile', metavar='SECONDS', type=float,
+                        nargs='?', const=30,
+                        help=("Profiles reader, pipeline and recorder "
+                              "threads for SECONDS, then stops and shows hot "
+                              "functions. Default: 30"))
+    parser.add_argument('--profile-mode', default='deterministic',
+                        choices=('deterministic', 'sampling'),
+                        help=("deterministic (cProfile, pstats file) or "
+                              "sampling (lower overhead, collapsed stacks "
+                              "file). Default: deterministic"))
+    parser.add_argument('--profile-output', metavar='PROFILE_FILE',
+                        help=("Profile file. Default: neuropy3.prof "
+                              "(deterministic) or neuropy3.folded "
+                              "(sampling)"))
     args = parser.parse_args()
+    tracer = None
+    if args.trace is not None:
+        from neuropy3.trace import Tracer
+        tracer = Tracer()
+
+    def save_trace():
+        if tracer is not None:
+            tracer.report(args.verbose)
+            tracer.export(args.trace)
 
-    if not args.gui:
-        mw = MindWave(args.address, autostart=False, verbose=args.verbose)
-        if args.raw is not None:
-            files['raw'] = open(args.raw, 'w')
-            mw.update_callback('raw', log_raw)
+    if args.export is not None:
+        from neuropy3.parquet import export
+        for recording in args.export:
+            target, rows = export(recording, args.output)
+            print(f"{recording} -> {target} ({rows} rows)")
+    elif args.batch is not None:
+        from neuropy3 import batch
+        batch.run(args.batch, args.output, args.jobs,
+                  pattern=args.raw_pattern, verbose=args.verbose)
+    elif args.scan:
+        from neuropy3.registry import Registry
+        registry = Registry(verbose=args.verbose)
+        try:
+            registry.scan()
+        except OSError:
+            ut.log('error', "Could not use bluetooth. Check bluetooth is on.",
+                   args.verbose)
+            sys.exit(1)
+        for address, device in registry.known():
+            print(f"{address} {device['name']} "
+                  f"(last seen: {time.ctime(device['last_seen'])})")
+    elif not args.gui:
+        profiler = None
+        if args.profile is not None:
+            from neuropy3.profiling import Profiler
+            profiler = Profiler(args.profile_mode)
+        mw = MindWave(args.address, autostart=False, verbose=args.verbose,
+                      reconnect=args.reconnect, cache=not args.no_cache,
+                      tracer=tracer, profiler=profiler)
+        # Values are written by recorder thread, not reader thread
+        recorder = Recorder(verbose=args.verbose)
+        if args.codec is not None:
+            from neuropy3.codec import RawWriter, EXTENSION
+            from neuropy3.recorder import record_value
+            # Empty RAW_FILE: -r given without file name
+            recorder.add('raw', RawWriter(args.raw or f'raw{EXTENSION}',
+                                          args.codec), record_value)
+        elif args.raw is not None:
+            recorder.add('raw', open(args.raw or 'raw.csv', 'w'))
         if args.att is not None:
-            files['att'] = open(args.att, 'w')
-            mw.update_callback('attention', log_att)
+            recorder.add('attention', open(args.att, 'w'))
         if args.med is not None:
-            files['med'] = open(args.med, 'w')
-            mw.update_callback('meditation', log_med)
+            recorder.add('meditation', open(args.med, 'w'))
         if args.eeg is not None:
-            files['eeg'] = open(args.eeg, 'w')
-            mw.update_callback('eeg', log_eeg)
-        mw.start()
-        if mw.thread is not None:
-            try:
-                mw.thread.join()
-            except KeyboardInterrupt:
-                mw.stop()
-                for file in files.values():
-                    if file is not None:
-                        file.close()
+            recorder.add('eeg', open(args.eeg, 'w'))
+        if args.session is not None:
+            from neuropy3.session import SessionWriter
+            recorder.add_session(SessionWriter(args.session))
+        if args.parquet is not None:
+            from neuropy3.parquet import ParquetWriter
+            recorder.add_session(ParquetWriter(args.parquet))
+        if recorder.files:
+            if profiler is not None:
+                profiler.attach(recorder)
+            recorder.start()
+            mw.add_sink(recorder)
+        server = None
+        if args.serve is not None:
+            server = sv.StreamServer(args.serve, verbose=args.verbose)
+            server.start()
+            mw.add_sink(server)
+        outlet = None
+        if args.lsl:
+            from neuropy3.lsl import LSLOutlet
+            outlet = LSLOutlet(source_id=args.address or 'neuropy3')
+            mw.add_sink(outlet)
+        pipeline = None
+        if args.pipeline is not None:
+            from neuropy3.pipeline import Pipeline, load
+            pipeline = Pipeline(load(args.pipeline), verbose=args.verbose,
+                                tracer=tracer)
+            if profiler is not None:
+                for stage in pipeline.stages + pipeline.outputs:
+                    profiler.attach(stage)
+            pipeline.start()
+            mw.add_sink(pipeline)
+        stopping = Event()
+
+        def shutdown(signum, frame):
+            # Stages are stopped from main thread, a second signal exits
+            ut.log('info', f"{signal.Signals(signum).name} received, "
+                   f"stopping...", args.verbose)
+            signal.signal(signum, signal.SIG_DFL)
+            stopping.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+        failed = False
+        try:
+            mw.start()
+            deadline = (time.monotonic() + args.profile
+                        if profiler is not None else None)
+            while mw.thread.is_alive() and not stopping.wait(0.5):
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+            failed = mw.thread.failed and not mw.thread.is_alive()
+        finally:
+            # Also if connection fails: stopped in data flow order,
+            # reader, dispatch stages and writers, so buffered values
+            # are written
+            mw.stop()
+            if server is not None:
+                server.stop()
+            if outlet is not None:
+                outlet.flush()
+            if pipeline is not None:
+                pipeline.stop()
+                pipeline.report()
+            recorder.stop()
+            save_trace()
+            if profiler is not None:
+                profiler.stop()
+                output = args.profile_output or (
+                    'neuropy3.prof' if args.profile_mode == 'deterministic'
+                    else 'neuropy3.folded')
+                profiler.save(output)
+                print(profiler.summary())
+                ut.log('info', f"Profile stored in {output}.", args.verbose)
+        if failed:
+            sys.exit(1)
     else:
-        gui.main(args.address)
+        from neuropy3.gui import gui
+        try:
+            gui.main(args.address, args.scroll, tracer, args.verbose)
+        finally:
+            save_trace()
 
 
 if __name__ == '__main__':
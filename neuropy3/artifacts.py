@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# artifacts - Streaming artifact detection module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from collections import deque
+
+
+FLAGS = ('saturation', 'flatline', 'poor_signal', 'blink')
+
+
+class ArtifactDetector:
+    """Flags contaminated raw blocks: saturated (clipped) values,
+    flatline (electrode off or disconnected), poor signal reported by
+    headset and blinks (blink strength).
+    Used as MindWave sink (see ``MindWave.add_sink``), add it before
+    stages checking ``contaminated``.
+    :param block: Number of raw samples per block
+    :type block: int, optional. Default: 128
+    :param saturation: Absolute raw value considered clipped
+    :type saturation: int, optional. Default: 2000
+    :param flatline: Maximum raw peak-to-peak of a flat block
+    :type flatline: int, optional. Default: 2
+    :param poor_signal: Minimum poor signal value flagged (200: no contact)
+    :type poor_signal: int, optional. Default: 50
+    :param blink: Minimum blink strength flagged
+    :type blink: int, optional. Default: 50
+    :param callback: Function called with the mask of every block
+    :type callback: function, optional
+    :param history: Number of block masks kept
+    :type history: int, optional. Default: 64
+    """
+    def __init__(self, block=128, saturation=2000, flatline=2,
+                 poor_signal=50, blink=50, callback=None, history=64):
+        self.block = block
+        self.saturation = saturation
+        self.flatline = flatline
+        self.poor_signal = poor_signal
+        self.blink = blink
+        self.callback = callback
+        self.history = deque(maxlen=history)
+        self.raw = []
+        self.samples = 0
+        self.signal = 0
+        self.blinked = False
+
+    def detect(self, raw):
+        """Flags of raw values based on the values only
+        :param raw: Raw values
+        :type raw: list or numpy.ndarray
+        :return: saturation and flatline flags
+        :rtype: dict"""
+        # int16 arrays would overflow in high - low
+        low, high = int(min(raw)), int(max(raw))
+        return {
+            'saturation': bool(high >= self.saturation
+                               or low <= -self.saturation),
+            'flatline': bool(high - low <= self.flatline)
+        }
+
+    def update(self, name, value, timestamp):
+        """Sink interface, see ``MindWave.add_sink``"""
+        if name == 'raw':
+            self.raw.append(value)
+            self.samples += 1
+            if len(self.raw) == self.block:
+                mask = self.detect(self.raw)
+                mask['poor_signal'] = self.signal >= self.poor_signal
+                mask['blink'] = self.blinked
+                mask['contaminated'] = any(mask[flag] for flag in FLAGS)
+                mask['start'] = self.samples - self.block
+                mask['end'] = self.samples
+                mask['timestamp'] = timestamp
+                self.history.append(mask)
+                self.raw = []
+                self.blinked = False
+                if self.callback is not None:
+                    self.callback(mask)
+        elif name == 'signal':
+            self.signal = value
+        elif name == 'blink' and value >= self.blink:
+            # Blink strength is reported after the blink, flag both the
+            # current and the previous block
+            self.blinked = True
+            if self.history:
+                self.history[-1]['blink'] = True
+                self.history[-1]['contaminated'] = True
+
+    def contaminated(self, start, end):
+        """Checks if any raw sample in a range was flagged
+        :param start: First raw sample (samples counter)
+        :type start: int
+        :param end: Last raw sample, not included
+        :type end: int
+        :rtype: bool"""
+        if (self.raw and end > self.samples - len(self.raw)
+                and (self.blinked or self.signal >= self.poor_signal)):
+            return True
+        return any(mask['contaminated'] for mask in self.history
+                   if mask['start'] < end and mask['end'] > start)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# batch - Offline batch processing module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from concurrent.futures import ProcessPoolExecutor
+from neuropy3.artifacts import ArtifactDetector
+from neuropy3.features import FeatureExtractor
+from neuropy3.session import SessionReader
+from neuropy3.codec import RawReader
+from neuropy3.decoder import decode_file
+from scipy.fft import irfft, rfft, rfftfreq
+from neuropy3 import utils as ut
+from pathlib import Path
+
+import numpy as np
+import fnmatch
+import os
+
+
+RAW_PATTERN = '*raw*.csv'
+
+
+def load_csv(path):
+    """Raw values of a file written by ``python -m neuropy3 --raw``
+    (one value per line)"""
+    return np.loadtxt(path, dtype=np.int16, ndmin=1)
+
+
+def load_capture(path):
+    """Raw values decoded from a ThinkGear byte stream capture (see
+    neuropy3.decoder)"""
+    return decode_file(path)['raw']
+
+
+def load_compressed(path):
+    """Raw values of a compressed recording (see neuropy3.codec)"""
+    with RawReader(path) as reader:
+        return reader.read()
+
+
+def load_session(path):
+    """Raw values of a session file (see neuropy3.session)"""
+    return SessionReader(path).raw()
+
+
+LOADERS = {
+    '.csv': load_csv,
+    '.bin': load_capture,
+    '.rawz': load_compressed,
+    '.np3': load_session
+}
+
+
+def not_raw_csv(path, pattern=RAW_PATTERN):
+    """Checks if a CSV file is a raw recording: file name matches pattern
+    (e.g. ``python -m neuropy3 --raw`` default raw.csv) and first line is
+    a single value, so attention, meditation and eeg recordings of the
+    same directory are not processed
+    :param path: CSV file
+    :type path: pathlib.Path
+    :param pattern: Raw recordings file name pattern (case insensitive)
+    :type pattern: str, optional. Default: *raw*.csv
+    :return: Why file is not a raw recording, None if it is
+    :rtype: str or None"""
+    if not fnmatch.fnmatchcase(path.name.lower(), pattern.lower()):
+        return f"name does not match {pattern}"
+    try:
+        with open(path) as f:
+            line = f.readline().strip()
+        int(line)
+    except (OSError, UnicodeDecodeError, ValueError):
+        return "first line is not a single raw value"
+    return None
+
+
+def sessions(directory, pattern=RAW_PATTERN, verbose=1):
+    """Recorded sessions of a directory, sorted by name. CSV files only
+    if they are raw recordings, see ``not_raw_csv``, others are reported
+    :param directory: Sessions directory
+    :type directory: str
+    :param pattern: Raw recordings CSV file name pattern
+    :type pattern: str, optional. Default: *raw*.csv
+    :param verbose: Verbose level
+    :type verbose: int, optional. Allowed values: 0-4. Default: 1
+    :rtype: list of pathlib.Path"""
+    found = []
+    for path in sorted(Path(directory).iterdir()):
+        if path.suffix not in LOADERS:
+            continue
+        if path.suffix == '.csv':
+            reason = not_raw_csv(path, pattern)
+            if reason is not None:
+                ut.log('info', f"Skipped {path.name}: {reason}.", verbose)
+                continue
+        found.append(path)
+    return found
+
+
+def process_session(path, output, chunk=60):
+    """Decodes a session, converts it to microvolts, decomposes it in
+    bands and extracts features of every 1 second window. Windows are
+    transformed in chunks, bounding FFT temporaries, the whole session
+    and its results are kept in memory. Results are stored in output
+    directory as columnar numpy files, named after the session file
+    name, so recordings of different formats do not overwrite each
+    other:
+    <session file>.samples.npz: raw, microvolts and one column per band
+    <session file>.features.npz: time (window start), artifact flag and
+                                 one column per feature (NaN if
+                                 artifact)
+    :param path: Session file
+    :type path: pathlib.Path
+    :param output: Output directory
+    :type output: pathlib.Path
+    :param chunk: Windows per chunk
+    :type chunk: int, optional. Default: 60
+    :return: Session file, samples and windows processed
+    :rtype: tuple(str, int, int)"""
+    window = ut.SAMPLE_RATE
+    raw = LOADERS[path.suffix](path)
+    # Only whole windows are decomposed
+    raw = raw[:len(raw) // window * window]
+    microvolts = ut.raw_to_microvolts(raw)
+    freqs = rfftfreq(window, d=1/ut.SAMPLE_RATE)
+    masks = {band: (freqs >= low) & (freqs < high)
+             for band, (low, high) in ut.EEG.items()}
+    extractor = FeatureExtractor(window)
+    detector = ArtifactDetector()
+    artifact = np.zeros(len(raw) // window, dtype=bool)
+    bands = {band: np.empty(len(raw), dtype=np.float32) for band in masks}
+    features = {name: np.empty(len(raw) // window)
+                for name in extractor.names}
+    for start in range(0, len(raw), chunk * window):
+        block = microvolts[start:start + chunk * window].reshape(-1, window)
+        # One FFT per window, shared by every band
+        spectrum = rfft(block, axis=1)
+        for band, mask in masks.items():
+            bands[band][start:start + block.size] = irfft(
+                spectrum * mask, n=window, axis=1).ravel()
+        for idx, samples in enumerate(block, start // window):
+            flags = detector.detect(raw[idx * window:(idx + 1) * window])
+            if any(flags.values()):
+                # No FFT work on contaminated windows
+                artifact[idx] = True
+                for name in features:
+                    features[name][idx] = np.nan
+                continue
+            for name, value in extractor.compute(samples).items():
+                features[name][idx] = value
+    output.mkdir(parents=True, exist_ok=True)
+    np.savez(output / f'{path.name}.samples.npz', raw=raw,
+             microvolts=microvolts.astype(np.float32), **bands)
+    np.savez(output / f'{path.name}.features.npz',
+             time=np.arange(len(raw) // window, dtype=np.float64),
+             artifact=artifact, **features)
+    return str(path), len(raw), len(raw) // window
+
+
+def _process(args):
+    # Errors are returned, so one session does not abort the others
+    try:
+        return process_session(*args), None
+    except Exception as e:
+        return (str(args[0]), 0, 0), f"{type(e).__name__}: {e}"
+
+
+def run(directory, output, jobs=None, chunk=60, pattern=RAW_PATTERN,
+        verbose=1):
+    """Processes every session of a directory in a process pool. Sessions
+    that fail are reported and skipped
+    :param directory: Sessions directory
+    :type directory: str
+    :param output: Output directory
+    :type output: str
+    :param jobs: Number of worker processes
+    :type jobs: int, optional. Default: number of CPUs
+    :param chunk: Windows per chunk, see process_session
+    :type chunk: int, optional. Default: 60
+    :param pattern: Raw recordings CSV file name pattern, see sessions
+    :type pattern: str, optional. Default: *raw*.csv
+    :param verbose: Verbose level
+    :type verbose: int, optional. Allowed values: 0-4. Default: 1
+    :return: Session file, samples and windows of every session
+             processed
+    :rtype: list of tuple(str, int, int)"""
+    output = Path(output)
+    work = [(path, output, chunk)
+            for path in sessions(directory, pattern, verbose)]
+    ut.log('info', f"Processing {len(work)} sessions...", verbose)
+    results = []
+    jobs = jobs or os.cpu_count()
+    # Several sessions per task, reduces inter-process overhead
+    chunksize = max(1, len(work) // (4 * jobs))
+    with ProcessPoolExecutor(jobs) as pool:
+        for result, error in pool.map(_process, work,
+                                      chunksize=chunksize):
+            if error is not None:
+                ut.log('error', f"Could not process {result[0]}: {error}",
+                       verbose)
+                continue
+            ut.log('succ', f"Processed {result[0]}: {result[1]} samples.",
+                   verbose)
+            results.append(result)
+    failed = len(work) - len(results)
+    ut.log('info', f"Processed {len(results)} sessions"
+           f"{f', {failed} failed' if failed else ''}.", verbose)
+    return results
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# client - Local streaming client module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from neuropy3 import server as sv
+from neuropy3 import utils as ut
+
+import numpy as np
+import socket
+
+
+class StreamClient:
+    """Client of neuropy3 streaming server (``python -m neuropy3 --serve``)
+    :param address: Address in the form tcp:HOST:PORT or unix:PATH
+    :type address: str, optional. Default: tcp:127.0.0.1:7357
+    """
+    def __init__(self, address=sv.ADDRESS):
+        self.address = address
+        self.socket = None
+        self.buffer = bytearray(1 << 16)
+        self.view = memoryview(self.buffer)
+        self.sample_rate = ut.SAMPLE_RATE
+
+    def connect(self):
+        """Connects to streaming server"""
+        family, location = sv.parse_address(self.address)
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.connect(location)
+
+    def close(self):
+        """Closes connection with streaming server"""
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _recv(self, n_bytes):
+        """Reads exactly n_bytes in preallocated buffer
+        :return: View of the bytes read
+        :rtype: memoryview"""
+        if n_bytes > len(self.buffer):
+            self.buffer = bytearray(n_bytes)
+            self.view = memoryview(self.buffer)
+        read = 0
+        while read < n_bytes:
+            size = self.socket.recv_into(self.view[read:n_bytes])
+            if not size:
+                raise ConnectionError("Streaming server closed connection.")
+            read += size
+        return self.view[:n_bytes]
+
+    def messages(self):
+        """Yields every message received until server disconnects
+        :return: Message type (raw, esense, eeg or vector), timestamp and
+                 data. raw data is a numpy int16 array,
+                 esense data is a tuple (name, value),
+                 eeg data is a numpy uint32 array in ut.NAMES[6:] order,
+                 vector data is a numpy float32 array (pipeline output)
+        :rtype: generator of tuple(str, float, object)"""
+        try:
+            while True:
+                length, mtype = sv.FRAME.unpack(self._recv(sv.FRAME.size))
+                payload = self._recv(length)
+                if mtype == sv.MSG['raw']:
+                    yield ('raw', sv.TIMESTAMP.unpack_from(payload)[0],
+                           np.frombuffer(payload, dtype='<i2',
+                                         offset=sv.TIMESTAMP.size).copy())
+                elif mtype == sv.MSG['esense']:
+                    timestamp, name, value = sv.ESENSE_VALUE.unpack(payload)
+                    yield 'esense', timestamp, (sv.ESENSE[name], value)
+                elif mtype == sv.MSG['eeg']:
+                    yield ('eeg', sv.TIMESTAMP.unpack_from(payload)[0],
+                           np.frombuffer(payload, dtype='<u4',
+                                         offset=sv.TIMESTAMP.size).copy())
+                elif mtype == sv.MSG['vector']:
+                    yield ('vector', sv.TIMESTAMP.unpack_from(payload)[0],
+                           np.frombuffer(payload, dtype='<f4',
+                                         offset=sv.TIMESTAMP.size).copy())
+                elif mtype == sv.MSG['hello']:
+                    _, self.sample_rate = sv.HELLO.unpack(payload)
+        except ConnectionError:
+            return
+
+    def blocks(self, size=ut.SAMPLE_RATE):
+        """Yields raw samples grouped in blocks, ignoring other messages
+        :param size: Number of samples per block
+        :type size: int, optional. Default: 512
+        :return: Timestamp of last sample and raw samples of the block
+        :rtype: generator of tuple(float, numpy.ndarray)"""
+        block = np.empty(size, dtype=np.int16)
+        filled = 0
+        for mtype, timestamp, data in self.messages():
+            if mtype != 'raw':
+                continue
+            while len(data):
+                count = min(size - filled, len(data))
+                block[filled:filled + count] = data[:count]
+                filled += count
+                data = data[count:]
+                if filled == size:
+                    yield (timestamp - len(data) / self.sample_rate,
+                           block.copy())
+                    filled = 0
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# codec - Compressed raw recording module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from neuropy3 import utils as ut
+
+import numpy as np
+import struct
+import zlib
+import lzma
+
+
+MAGIC = b'NP3R'
+VERSION = 1
+EXTENSION = '.rawz'
+HEADER = struct.Struct('<4sBB')  # Magic, version, method
+BLOCK = struct.Struct('<QII')  # First sample, samples, payload bytes
+METHODS = ('none', 'zlib', 'lzma')
+BLOCK_SIZE = 4 * ut.SAMPLE_RATE
+
+
+def _compress(method, data):
+    if method == 'zlib':
+        return zlib.compress(data)
+    elif method == 'lzma':
+        return lzma.compress(data, format=lzma.FORMAT_RAW,
+                             filters=[{'id': lzma.FILTER_LZMA2,
+                                       'preset': 1}])
+    return data
+
+
+def _decompress(method, data):
+    if method == 'zlib':
+        return zlib.decompress(data)
+    elif method == 'lzma':
+        return lzma.decompress(data, format=lzma.FORMAT_RAW,
+                               filters=[{'id': lzma.FILTER_LZMA2}])
+    return data
+
+
+def encode(raw, method='zlib'):
+    """Encodes a block of raw values: deltas from previous value (first
+    value is the delta from 0), bytes shuffled (low bytes, then high
+    bytes) and compressed. Lossless, deltas wrap around int16.
+    :param raw: Raw values
+    :type raw: list or numpy.ndarray
+    :param method: Compression method
+    :type method: str, optional. Allowed values: none, zlib, lzma.
+                  Default: zlib
+    :rtype: bytes"""
+    raw = np.asarray(raw, dtype=np.int16)
+    delta = np.diff(raw, prepend=np.int16(0)).astype('<i2')
+    shuffled = delta.view(np.uint8).reshape(-1, 2).T.tobytes()
+    return _compress(method, shuffled)
+
+
+def decode(payload, samples, method='zlib'):
+    """Decodes a block encoded with ``encode``
+    :param payload: Encoded block
+    :type payload: bytes
+    :param samples: Number of raw values in block
+    :type samples: int
+    :param method: Compression method
+    :type method: str, optional. Default: zlib
+    :rtype: numpy.ndarray of int16"""
+    shuffled = np.frombuffer(_decompress(method, payload), dtype=np.uint8)
+    delta = shuffled.reshape(2, samples).T.copy().view('<i2').ravel()
+    return np.cumsum(delta, dtype=np.int16)
+
+
+class RawWriter:
+    """Writes raw values to a compressed recording, made of independent
+    blocks so it can be read from any block (see RawReader). Values are
+    encoded every ``block`` values, at most once every 4 seconds with the
+    default block size. Unfinished block is written when closed.
+    Can be used as MindWave sink (see ``MindWave.add_sink``) or
+    callback (``write``).
+    :param path: Recording file path
+    :type path: str
+    :param method: Compression method
+    :type method: str, optional. Allowed values: none, zlib, lzma.
+                  Default: zlib
+    :param block: Raw values per block
+    :type block: int, optional. Default: 2048 (4 seconds)
+    """
+    def __init__(self, path, method='zlib', block=BLOCK_SIZE):
+        if method not in METHODS:
+            raise ValueError(f"Unknown compression method: {method}")
+        self.path = path
+        self.method = method
+        self.block = block
+        self.pending = []
+        self.samples = 0
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, METHODS.index(method)))
+
+    def write(self, value):
+        """Appends a raw value"""
+        self.pending.append(value)
+        if len(self.pending) >= self.block:
+            self._write_block()
+
+    def update(self, name, value, timestamp):
+        """Sink interface, see ``MindWave.add_sink``"""
+        if name == 'raw':
+            self.write(value)
+
+    def _write_block(self):
+        if self.pending:
+            payload = encode(self.pending, self.method)
+            self.file.write(BLOCK.pack(self.samples, len(self.pending),
+                                       len(payload)))
+            self.file.write(payload)
+            self.samples += len(self.pending)
+            self.pending = []
+
+    def flush(self):
+        """Flushes written blocks to disk"""
+        self.file.flush()
+
+    def close(self):
+        """Writes pending values and closes recording"""
+        if not self.file.closed:
+            self._write_block()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RawReader:
+    """Reads a compressed recording written by RawWriter. Block headers
+    are indexed when opened, reading a range only decodes the blocks
+    containing it.
+    :param path: Recording file path
+    :type path: str
+    :raises ValueError: If file is not a compressed recording
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        magic, version, method = HEADER.unpack(
+            self.file.read(HEADER.size).ljust(HEADER.size, b'\x00'))
+        if magic != MAGIC or version != VERSION:
+            self.file.close()
+            raise ValueError(f"{path} is not a compressed recording")
+        self.method = METHODS[method]
+        # (first sample, samples, payload offset, payload bytes)
+        self.index = []
+        self.samples = 0
+        self._scan()
+
+    def _scan(self):
+        end = self.file.seek(0, 2)
+        offset = HEADER.size
+        while True:
+            self.file.seek(offset)
+            header = self.file.read(BLOCK.size)
+            if len(header) < BLOCK.size:
+                break
+            first, samples, size = BLOCK.unpack(header)
+            if offset + BLOCK.size + size > end:
+                # Truncated last block, e.g. recording interrupted
+                break
+            self.index.append((first, samples, offset + BLOCK.size, size))
+            self.samples = first + samples
+            offset += BLOCK.size + size
+
+    def __len__(self):
+        return self.samples
+
+    def blocks(self):
+        """Decoded blocks, in order
+        :return: First sample and raw values of every block
+        :rtype: generator of tuple(int, numpy.ndarray)"""
+        for first, samples, offset, size in self.index:
+            self.file.seek(offset)
+            yield first, decode(self.file.read(size), samples, self.method)
+
+    def read(self, start=0, stop=None):
+        """Raw values of a range of samples
+        :param start: First sample
+        :type start: int, optional. Default: 0
+        :param stop: Last sample, not included
+        :type stop: int, optional. Default: end of recording
+        :rtype: numpy.ndarray of int16"""
+        stop = self.samples if stop is None else min(stop, self.samples)
+        parts = []
+        for first, samples, offset, size in self.index:
+            if first + samples <= start or first >= stop:
+                continue
+            self.file.seek(offset)
+            raw = decode(self.file.read(size), samples, self.method)
+            parts.append(raw[max(0, start - first):stop - first])
+        if not parts:
+            return np.empty(0, dtype=np.int16)
+        return np.concatenate(parts)
+
+    def close(self):
+        """Closes recording"""
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
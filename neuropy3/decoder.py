@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# decoder - Vectorized ThinkGear capture decoding module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# numba is optional: if installed, the frame scan is a compiled byte loop,
+# otherwise it is vectorized with NumPy
+
+from neuropy3.neuropy3 import (SYNC, STEPS, RAW, EEG, MAX_SINGLE,
+                               SINGLE_NAMES, MindWaveReader)
+from neuropy3.transport import StreamTransport
+from neuropy3 import utils as ut
+from threading import Event
+from bisect import bisect_left
+
+import numpy as np
+import argparse
+import time
+import sys
+import io
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+CHUNK = 1 << 22  # bytes
+PLENGTH_MAX = ut.PLENGTH_MAX
+NAMES = SINGLE_NAMES + ['eeg']
+
+
+def _scan_loop(data, starts):
+    # Byte loop of MindWaveReader._read_packet, compiled with numba
+    length = len(data)
+    count = 0
+    idx = 0
+    while idx < length:
+        if data[idx] != SYNC:
+            idx += 1
+            continue
+        if idx + 1 >= length:
+            break
+        if data[idx + 1] != SYNC:
+            idx += 2
+            continue
+        if idx + 2 >= length:
+            break
+        plength = int(data[idx + 2])
+        if plength >= PLENGTH_MAX:
+            idx += 3
+            continue
+        if idx + 4 + plength > length:
+            break
+        chksum = 0
+        for pos in range(idx + 3, idx + 3 + plength):
+            chksum = (chksum + int(data[pos])) & 0xFF
+        if ~chksum & 0xFF == data[idx + 3 + plength]:
+            starts[count] = idx
+            count += 1
+        idx += 4 + plength
+    return count, idx
+
+
+def _walk(data, keys, ends, last):
+    """Follows steps from first byte, jumping over runs of consecutive
+    packets: runs (first and last key) and bytes consumed"""
+    # Python ints indexing memoryviews, faster than numpy scalars
+    data, keys, ends, last = map(memoryview, (data, keys, ends, last))
+    length = len(data)
+    first, final = [], []
+    idx = 0
+    while idx < length:
+        if data[idx] != SYNC:
+            idx += 1
+            continue
+        key = bisect_left(keys, idx)
+        if key < len(keys) and keys[key] == idx:
+            first.append(key)
+            final.append(last[key])
+            idx = ends[last[key]]
+            continue
+        # Not a complete packet: SYNC, too large length or cut at end
+        if idx + 1 >= length:
+            break
+        if data[idx + 1] != SYNC:
+            idx += 2
+            continue
+        if idx + 2 >= length or data[idx + 2] < PLENGTH_MAX:
+            break
+        idx += 3
+    return (np.array(first, dtype=np.int64),
+            np.array(final, dtype=np.int64), idx)
+
+
+def _scan_numpy(data):
+    length = len(data)
+    sync = data == SYNC
+    header = sync[:-1] & sync[1:]
+    # Complete packets and where they end
+    keys = np.flatnonzero(header[:-1] & (data[2:] < PLENGTH_MAX))
+    ends = keys + 4 + data[keys + 2]
+    keys, ends = keys[ends <= length], ends[ends <= length]
+    # A run of packets ends where next packet does not follow
+    breaks = np.append(np.flatnonzero(ends[:-1] != keys[1:]),
+                       len(keys) - 1)
+    last = breaks[np.searchsorted(breaks, np.arange(len(keys)))]
+    first, final, consumed = _walk(data, keys, ends, last)
+    sizes = final - first + 1
+    runs = np.repeat(first - np.cumsum(sizes) + sizes, sizes)
+    starts = keys[runs + np.arange(sizes.sum())]
+    # Payload sums wrap around in uint8, as checksum
+    sizes = data[starts + 2]
+    bounds = np.empty(2 * len(starts), dtype=np.int64)
+    bounds[0::2] = starts + 3
+    bounds[1::2] = starts + 3 + sizes
+    chksum = np.zeros(len(starts), dtype=np.uint8)
+    if len(starts):
+        chksum = np.add.reduceat(data, bounds, dtype=np.uint8)[0::2]
+        chksum[sizes == 0] = 0
+    return starts[~chksum == data[bounds[1::2]]], consumed
+
+
+if njit is not None:
+    _scan_jit = njit(cache=True, nogil=True)(_scan_loop)
+
+
+def scan(data):
+    """Frame scan of a ThinkGear byte stream, following the
+    synchronization of ``MindWaveReader._read_packet``: a byte other than
+    SYNC is skipped, SYNC followed by another byte skips both, a too large
+    payload length skips the header, otherwise the whole packet is
+    skipped. Compiled byte loop if numba is installed, otherwise packet
+    boundaries and checksums are computed at once with NumPy and only
+    the chain of steps from the first byte is followed
+    :param data: Byte stream
+    :type data: numpy.ndarray (uint8)
+    :return: Start of packets with valid checksum and bytes consumed
+             (a packet cut at the end of data is not consumed)
+    :rtype: tuple(numpy.ndarray, int)"""
+    if njit is None:
+        return _scan_numpy(data)
+    starts = np.empty(len(data) // 4 + 1, dtype=np.int64)
+    count, consumed = _scan_jit(data, starts)
+    return starts[:count], consumed
+
+
+def parse_payload(payload):
+    """Values of a packet payload, same as ``MindWaveReader._read_packet``
+    (values read before a malformed value are kept)
+    :param payload: Packet payload
+    :type payload: bytes
+    :return: Value name and value (eeg: tuple of 8 bands)
+    :rtype: list of tuple(str, int or tuple)"""
+    values = []
+    plength = len(payload)
+    idx = 0
+    while idx < plength:
+        code = payload[idx]
+        if code in STEPS:
+            break
+        idx += 1
+        if idx >= plength:
+            break
+        if code < MAX_SINGLE:
+            name = ut.CODE_INT.get(code)
+            if name in SINGLE_NAMES:
+                values.append((name, payload[idx]))
+        else:
+            vlength = payload[idx]
+            if idx + vlength >= plength:
+                break
+            if code == RAW and vlength == ut.PKT_RAW_MAX:
+                value = payload[idx + 1] << 8 | payload[idx + 2]
+                values.append(('raw', value - 0x10000
+                               if value >= 0x8000 else value))
+            elif code == EEG and vlength == ut.PKT_EEG_MAX:
+                values.append(('eeg', tuple(
+                    int.from_bytes(payload[pos:pos + 3], 'big')
+                    for pos in range(idx + 1, idx + 1 + vlength, 3))))
+            idx += vlength
+        idx += 1
+    return values
+
+
+def decode(data):
+    """Decodes every packet of a ThinkGear byte stream into arrays. Raw
+    only packets (512 per second) are decoded at once, other packets
+    with ``parse_payload``
+    :param data: Byte stream
+    :type data: bytes or bytearray or numpy.ndarray (uint8)
+    :return: packets: valid packets, consumed: bytes decoded (a packet cut
+             at the end is left for next data), raw: raw values (int16),
+             and for every other value (see NAMES) a tuple of positions
+             (raw values read before it) and values (uint8, eeg: uint32
+             rows of 8 bands)
+    :rtype: dict"""
+    data = np.frombuffer(data, dtype=np.uint8)
+    starts, consumed = scan(data)
+    sizes = data[starts + 2]
+    # Raw packet: SYNC SYNC 0x04 0x80 0x02 high low checksum
+    raw_only = sizes == 4
+    four = starts[raw_only]
+    raw_only[raw_only] = ((data[four + 3] == RAW)
+                          & (data[four + 4] == ut.PKT_RAW_MAX))
+    counts = raw_only.astype(np.int64)
+    others = {}
+    for packet in np.flatnonzero(~raw_only).tolist():
+        start = int(starts[packet])
+        values = parse_payload(
+            data[start + 3:start + 3 + int(sizes[packet])].tobytes())
+        if values:
+            others[packet] = values
+            counts[packet] = sum(name == 'raw' for name, _ in values)
+    offsets = np.cumsum(counts) - counts
+    raw = np.empty(int(counts.sum()), dtype=np.int16)
+    fast = starts[raw_only]
+    raw[offsets[raw_only]] = ((data[fast + 5].astype(np.uint16) << 8)
+                              | data[fast + 6]).view(np.int16)
+    positions = {name: [] for name in NAMES}
+    values = {name: [] for name in NAMES}
+    for packet, decoded in others.items():
+        position = int(offsets[packet])
+        for name, value in decoded:
+            if name == 'raw':
+                raw[position] = value
+                position += 1
+            else:
+                positions[name].append(position)
+                values[name].append(value)
+    result = _arrays(positions, values)
+    # Empty packets are not counted by reader
+    result.update(packets=int(np.count_nonzero(sizes)), consumed=consumed,
+                  raw=raw)
+    return result
+
+
+def decode_chunks(chunks):
+    """Decodes consecutive chunks of a byte stream, packets cut between
+    chunks included, see ``decode``
+    :param chunks: Byte stream chunks
+    :type chunks: iterable of bytes
+    :return: packets, raw and every other value, see ``decode``
+    :rtype: dict"""
+    parts = []
+    pending = b''
+    for data in chunks:
+        data = pending + data
+        parts.append(decode(data))
+        pending = data[parts[-1]['consumed']:]
+    result = _arrays({name: [] for name in NAMES},
+                     {name: [] for name in NAMES})
+    result['packets'] = sum(part['packets'] for part in parts)
+    result['raw'] = np.concatenate([np.empty(0, dtype=np.int16)]
+                                   + [part['raw'] for part in parts])
+    # Positions shifted by raw values of previous chunks
+    offsets = np.cumsum([0] + [len(part['raw']) for part in parts])
+    for name in NAMES:
+        result[name] = (
+            np.concatenate([result[name][0]]
+                           + [part[name][0] + offset
+                              for part, offset in zip(parts, offsets)]),
+            np.concatenate([result[name][1]]
+                           + [part[name][1] for part in parts]))
+    return result
+
+
+def decode_file(path, chunk=CHUNK):
+    """Decodes a ThinkGear byte stream capture in chunks, see ``decode``
+    :param path: Capture file path
+    :type path: str
+    :param chunk: Bytes read at once
+    :type chunk: int, optional. Default: 4 MiB
+    :return: packets, raw and every other value, see ``decode``
+    :rtype: dict"""
+    with open(path, 'rb') as f:
+        return decode_chunks(iter(lambda: f.read(chunk), b''))
+
+
+def _arrays(positions, values):
+    """Positions and values arrays of every value but raw"""
+    arrays = {name: (np.array(positions[name], dtype=np.int64),
+                     np.array(values[name], dtype=np.uint8))
+              for name in SINGLE_NAMES}
+    arrays['eeg'] = (np.array(positions['eeg'], dtype=np.int64),
+                     np.array(values['eeg'], dtype=np.uint32)
+                     .reshape(-1, len(ut.NAMES[6:])))
+    return arrays
+
+
+def reference(data):
+    """Decodes a byte stream with ``MindWaveReader``, output as
+    ``decode``
+    :param data: Byte stream
+    :type data: bytes
+    :rtype: dict"""
+    raw = []
+    positions = {name: [] for name in NAMES}
+    values = {name: [] for name in NAMES}
+
+    def callback(name):
+        def store(value):
+            positions[name].append(len(raw))
+            values[name].append(tuple(value.values()) if name == 'eeg'
+                                else value)
+        return store
+
+    callbacks = {name: callback(name) for name in NAMES}
+    callbacks['raw'] = raw.append
+    state = {'packets': 0, 'gaps': 0,
+             'values': {'eeg': dict.fromkeys(ut.NAMES[6:], 0)}}
+    reader = MindWaveReader(state, callbacks, Event(),
+                            StreamTransport(io.BytesIO(data)), 0,
+                            supervisor=lambda: None)
+    reader.run()
+    result = _arrays(positions, values)
+    result.update(packets=state['packets'],
+                  raw=np.array(raw, dtype=np.int16))
+    return result
+
+
+def corpus(seed=0):
+    """Shared corpus of byte streams checked by ``verify``: a synthetic
+    headset stream (see neuropy3.synthetic), and streams with noise, bad
+    checksums, too large lengths, repeated SYNC bytes, step, unknown and
+    malformed codes, mixed packets and a packet cut at the end
+    :param seed: Random generator seed
+    :type seed: int, optional. Default: 0
+    :return: Stream name and bytes
+    :rtype: dict"""
+    from neuropy3.synthetic import packet, synthetic_stream
+
+    rng = np.random.default_rng(seed)
+    stream = synthetic_stream(4, seed)
+    raw = packet(bytes([RAW, 2, 0x80, 0x01]))
+    eeg = bytes([EEG, ut.PKT_EEG_MAX]) + bytes(range(ut.PKT_EEG_MAX))
+    noise = rng.integers(0, 256, 4096, dtype=np.uint8).tobytes()
+    # Noise biased to SYNC bytes and small lengths
+    syncs = rng.choice([SYNC, SYNC, 0, 2, 4, 0x80, 0x83, 0xBA],
+                       4096).astype(np.uint8).tobytes()
+    corrupted = bytearray(stream)
+    for idx in rng.integers(0, len(corrupted), 64):
+        corrupted[idx] = rng.integers(0, 256)
+    bad = bytearray(raw)
+    bad[-1] ^= 0xFF
+    malformed = [
+        bytes([SYNC, SYNC, ut.PLENGTH_MAX]) + raw,
+        bytes([SYNC, SYNC, 0xFF]) + raw,
+        bytes([SYNC] * 5) + raw,
+        packet(b''),
+        packet(bytes([STEPS[0]])) + packet(bytes([0x02, 7, STEPS[1], 0x04,
+                                                  9])),
+        packet(bytes([0x01])),
+        packet(bytes([0x02, 7, 0x10, 3, 0x16, 1])),
+        packet(bytes([0x90, 2, 1, 2, 0x04, 5])),
+        packet(bytes([RAW, 3, 1, 2, 3, 0x05, 6])),
+        packet(bytes([RAW, 2, 1, 2, RAW, 2, 0xFF, 0xFE, 0x02, 0])),
+        packet(bytes([EEG, ut.PKT_EEG_MAX - 1])
+               + bytes(ut.PKT_EEG_MAX - 1) + bytes([0x04, 1])),
+        packet(bytes([RAW, 9, 1])),
+        packet(bytes([0x02, 200]) + eeg + bytes([0x04, 50, 0x05, 60])),
+        bytes(bad),
+    ]
+    return {
+        'synthetic': stream,
+        'noise': noise + stream[:4096],
+        'syncs': syncs + raw * 4,
+        'corrupted': bytes(corrupted),
+        'malformed': b''.join(packet + raw for packet in malformed),
+        'cut': stream[:-3],
+    }
+
+
+def _equal(decoded, expected):
+    return (decoded['packets'] == expected['packets']
+            and np.array_equal(decoded['raw'], expected['raw'])
+            and all(np.array_equal(decoded[name][idx], expected[name][idx])
+                    for name in NAMES for idx in range(2)))
+
+
+def verify(streams=None, chunks=(CHUNK, 1000, 7)):
+    """Checks ``decode`` (also by chunks, see ``decode_chunks``) against
+    ``MindWaveReader`` on every stream
+    :param streams: Stream name and bytes
+    :type streams: dict, optional. Default: ``corpus()``
+    :param chunks: Chunk sizes checked
+    :type chunks: tuple of int, optional
+    :return: Names of streams decoded differently
+    :rtype: list of str"""
+    if streams is None:
+        streams = corpus()
+    failed = []
+    for name, data in streams.items():
+        expected = reference(data)
+        for chunk in chunks:
+            decoded = decode_chunks(data[start:start + chunk]
+                                    for start in range(0, len(data), chunk))
+            if not _equal(decoded, expected):
+                failed.append(f'{name} (chunk {chunk})')
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python -m neuropy3.decoder',
+        description=("Checks the vectorized decoder against MindWaveReader "
+                     "on the shared corpus and the given captures, and "
+                     "compares their speed."))
+    parser.add_argument('captures', nargs='*', metavar='CAPTURE',
+                        help="ThinkGear byte stream captures.")
+    args = parser.parse_args()
+    streams = corpus()
+    for path in args.captures:
+        with open(path, 'rb') as f:
+            streams[path] = f.read()
+    print(f"kernel: {'numba' if njit is not None else 'numpy'}")
+    failed = verify(streams)
+    for name in streams:
+        data = streams[name]
+        start = time.perf_counter()
+        reference(data)
+        slow = time.perf_counter() - start
+        start = time.perf_counter()
+        decode(data)
+        fast = time.perf_counter() - start
+        print(f"{name}: {len(data) / 2**20:.2f}MiB, reader "
+              f"{len(data) / 2**20 / slow:.2f}MiB/s, decoder "
+              f"{len(data) / 2**20 / fast:.1f}MiB/s ({slow / fast:.0f}x)")
+    if failed:
+        ut.log('error', f"Decoded differently: {', '.join(failed)}.", 1)
+        sys.exit(1)
+    print("decoder: same values as reader")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# features - EEG band power feature extraction module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from scipy.fft import rfft, rfftfreq
+from neuropy3 import utils as ut
+
+import numpy as np
+
+
+def feature_names():
+    """Names of features, in feature vector order"""
+    names = [f'{band}_abs' for band in ut.EEG]
+    names += [f'{band}_rel' for band in ut.EEG]
+    names += ['alpha_theta', 'entropy', 'peak_alpha']
+    return names
+
+
+class FeatureExtractor:
+    """Computes band power features of microvolt windows from a single
+    spectrum per window. Frequency bins, band masks and window function
+    are computed once.
+    Used as MindWave sink (see ``MindWave.add_sink``), it emits features
+    of the latest window at a given rate.
+    :param window: Number of samples per window
+    :type window: int, optional. Default: 512 (1 second)
+    :param rate: Feature vectors emitted per second (sink)
+    :type rate: float, optional. Default: 1
+    :param callback: Function called with every feature dict (sink)
+    :type callback: function, optional
+    :param artifacts: Windows flagged as contaminated by this detector
+                      are skipped (sink)
+    :type artifacts: neuropy3.artifacts.ArtifactDetector, optional
+    :raises ValueError: If window is too short to have a frequency bin
+                        in every band
+    """
+    def __init__(self, window=ut.SAMPLE_RATE, rate=1, callback=None,
+                 artifacts=None):
+        self.window = window
+        self.hop = max(1, int(ut.SAMPLE_RATE / rate))
+        self.callback = callback
+        self.artifacts = artifacts
+        self.skipped = 0
+        self.taper = np.hanning(window)
+        # Power spectral density scale (one-sided, hann window)
+        self.scale = 2 / (ut.SAMPLE_RATE * np.sum(self.taper ** 2))
+        self.freqs = rfftfreq(window, d=1/ut.SAMPLE_RATE)
+        # Frequency resolution (Hz), band power integrates density over it
+        self.df = ut.SAMPLE_RATE / window
+        self.masks = {band: (self.freqs >= low) & (self.freqs < high)
+                      for band, (low, high) in ut.EEG.items()}
+        empty = [band for band, mask in self.masks.items() if not mask.any()]
+        if empty:
+            raise ValueError(
+                f"Window of {window} samples has no frequency bin in "
+                f"bands: {', '.join(empty)} (resolution "
+                f"{self.df:g}Hz), use a longer window")
+        self.total = np.logical_or.reduce(list(self.masks.values()))
+        self.alpha = self.freqs[self.masks['alpha']]
+        self.names = feature_names()
+        self.ring = ut.RingBuffer(window)
+        self.pending = 0
+        self.latest = None
+
+    def spectrum(self, microvolts):
+        """Power spectral density of a window
+        :param microvolts: Window samples (microvolts)
+        :type microvolts: numpy.ndarray
+        :return: Power spectral density (uV^2/Hz) per frequency bin
+                 (see freqs)
+        :rtype: numpy.ndarray"""
+        signal = np.asarray(microvolts, dtype=float)
+        signal = (signal - signal.mean()) * self.taper
+        return np.abs(rfft(signal)) ** 2 * self.scale
+
+    def compute(self, microvolts):
+        """Features of a window
+        :param microvolts: Window samples (microvolts), window length
+        :type microvolts: numpy.ndarray
+        :return: Absolute (uV^2) and relative power per band,
+                 alpha/theta ratio, normalized spectral entropy and
+                 peak alpha frequency (Hz)
+        :rtype: dict"""
+        # Power per frequency bin (uV^2)
+        power = self.spectrum(microvolts) * self.df
+        total = power[self.total].sum()
+        features = {}
+        for band, mask in self.masks.items():
+            features[f'{band}_abs'] = power[mask].sum()
+        for band in self.masks:
+            features[f'{band}_rel'] = (features[f'{band}_abs'] / total
+                                       if total else 0.)
+        theta = features['theta_abs']
+        features['alpha_theta'] = (features['alpha_abs'] / theta
+                                   if theta else 0.)
+        if total:
+            prob = power[self.total] / total
+            prob = prob[prob > 0]
+            features['entropy'] = (-np.sum(prob * np.log(prob))
+                                   / np.log(self.total.sum()))
+        else:
+            features['entropy'] = 0.
+        features['peak_alpha'] = self.alpha[
+            np.argmax(power[self.masks['alpha']])]
+        return features
+
+    def vector(self, features):
+        """Feature dict as numpy vector, in feature_names order"""
+        return np.array([features[name] for name in self.names])
+
+    def update(self, name, value, timestamp):
+        """Sink interface, see ``MindWave.add_sink``"""
+        if name == 'raw':
+            self.ring.append(ut.raw_to_microvolt(value))
+            self.pending += 1
+            if self.pending >= self.hop and self.ring.count >= self.window:
+                self.pending = 0
+                if (self.artifacts is not None
+                        and self.artifacts.contaminated(
+                            self.ring.count - self.window, self.ring.count)):
+                    self.skipped += 1
+                    return
+                self.latest = self.compute(self.ring.last(self.window))
+                self.latest['timestamp'] = timestamp
+                if self.callback is not None:
+                    self.callback(self.latest)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# bench - Headless GUI rendering benchmark.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import sys
+
+if not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY')):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtCharts import (QBarSeries, QBarSet, QCategoryAxis, QChart,
+                              QChartView, QLineSeries, QPolarChart,
+                              QSplineSeries, QValueAxis)
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import Qt
+from neuropy3.gui.gui import Backend
+
+import neuropy3.utils as ut
+import numpy as np
+import argparse
+import time
+
+
+def build_charts(backend, width=700, height=150):
+    """Creates the charts defined in gui.qml/raw.qml and registers them
+    in backend, without QML engine
+    :return: Chart views to be rendered
+    :rtype: list"""
+    views = []
+    for name in backend.charts:
+        chart = QChart()
+        serie = QLineSeries()
+        chart.addSeries(serie)
+        xaxis, yaxis = QValueAxis(), QValueAxis()
+        xaxis.setRange(0, 1)
+        chart.addAxis(xaxis, Qt.AlignBottom)
+        chart.addAxis(yaxis, Qt.AlignLeft)
+        serie.attachAxis(xaxis)
+        serie.attachAxis(yaxis)
+        backend.store_new_chart(name, serie, yaxis)
+        views.append(QChartView(chart))
+    polar = QPolarChart()
+    serie = QSplineSeries()
+    polar.addSeries(serie)
+    angular, radial = QCategoryAxis(), QValueAxis()
+    angular.setRange(0, 8)
+    radial.setRange(0, 20)
+    polar.addAxis(angular, QPolarChart.PolarOrientationAngular)
+    polar.addAxis(radial, QPolarChart.PolarOrientationRadial)
+    serie.attachAxis(angular)
+    serie.attachAxis(radial)
+    backend.store_new_polar(serie, angular)
+    views.append(QChartView(polar))
+    bars = QChart()
+    series = QBarSeries()
+    sets = [QBarSet(band) for band in ut.NAMES[6:]]
+    for bar in sets:
+        bar.append(0)
+        series.append(bar)
+    bars.addSeries(series)
+    backend.store_new_bars(*sets)
+    views.append(QChartView(bars))
+    for view in views:
+        view.resize(width, height)
+        view.show()
+    return views
+
+
+def load_raw(path, n_samples):
+    """Raw values of a replay file (one value per line, as written by
+    ``python -m neuropy3 --raw``) or synthetic raw values if path is None
+    :raises ValueError: If replay file has less than one update
+                        (SAMPLE_RATE values)"""
+    if path is None:
+        return ut.synthetic_raw(n_samples)
+    raw = np.loadtxt(path, dtype=np.int16, ndmin=1)
+    if len(raw) < ut.SAMPLE_RATE:
+        raise ValueError(f"{path} has {len(raw)} raw values, at least "
+                         f"{ut.SAMPLE_RATE} (1 second) are required")
+    return raw
+
+
+def run(updates=100, replay=None, render=True):
+    """Drives Backend.update_raw/update_asic once per second of data,
+    measuring wall and CPU time of every update
+    :param updates: Number of updates
+    :type updates: int, optional. Default: 100
+    :param replay: Replay file, synthetic data if None
+    :type replay: str, optional
+    :param render: Render charts after every update
+    :type render: bool, optional. Default: True
+    :return: Frame times (s) and CPU usage (%) per update
+    :rtype: tuple(numpy.ndarray, numpy.ndarray)
+    :raises ValueError: If replay file is too short, see load_raw"""
+    raw = load_raw(replay, updates * ut.SAMPLE_RATE)
+    app = QApplication.instance() or QApplication(sys.argv)
+    backend = Backend()
+    views = build_charts(backend)
+    app.processEvents()
+    rng = np.random.default_rng(0)
+    frames, cpu = [], []
+    for idx in range(updates):
+        start = (idx * ut.SAMPLE_RATE) % (len(raw) - ut.SAMPLE_RATE + 1)
+        block = raw[start:start + ut.SAMPLE_RATE]
+        asic = dict(zip(ut.NAMES[6:], rng.uniform(5, 15, 8)))
+        wall, proc = time.perf_counter(), time.process_time()
+        backend.update_raw(np.array([ut.raw_to_microvolt(value)
+                                     for value in block]))
+        backend.update_asic(asic)
+        if render:
+            for view in views:
+                view.grab()
+        app.processEvents()
+        wall = time.perf_counter() - wall
+        frames.append(wall)
+        cpu.append(100 * (time.process_time() - proc) / wall)
+    return np.array(frames), np.array(cpu)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python -m neuropy3.gui.bench',
+        description=("Headless GUI rendering benchmark. Runs offscreen "
+                     "if there is no display."))
+    parser.add_argument('-n', '--updates', type=int, default=100,
+                        help="Number of updates (1 second of data each).")
+    parser.add_argument('-r', '--replay', metavar='RAW_FILE',
+                        help="Replay raw values from RAW_FILE "
+                             "instead of synthetic data.")
+    parser.add_argument('--no-render', action='store_true',
+                        help="Measure backend updates only, "
+                             "without rendering charts.")
+    args = parser.parse_args()
+    try:
+        frames, cpu = run(args.updates, args.replay, not args.no_render)
+    except ValueError as e:
+        ut.log('error', str(e), 1)
+        sys.exit(1)
+    frames *= 1000
+    print(f"updates: {len(frames)}")
+    print(f"frame ms: mean {frames.mean():.2f} "
+          f"p50 {np.percentile(frames, 50):.2f} "
+          f"p95 {np.percentile(frames, 95):.2f} max {frames.max():.2f}")
+    print(f"cpu %: mean {cpu.mean():.1f} max {cpu.max():.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -24,61 +24,131 @@
 
 from PySide6.QtCharts import (QBarSet, QCategoryAxis, QLineSeries,
                               QSplineSeries, QValueAxis)
-from PySide6.QtCore import QObject, QPointF, Signal, Slot
+from PySide6.QtCore import QObject, QPointF, Qt, QTimer, Signal, Slot
 from PySide6.QtQml import QQmlApplicationEngine
 from PySide6.QtWidgets import QApplication
 from neuropy3.neuropy3 import MindWave
 from threading import Event, Thread
 from neuropy3.gui import resources  # noqa
+from queue import Queue, Empty, Full
 from PySide6.QtGui import QIcon
-from queue import Queue
+from pathlib import Path
 
 import neuropy3.utils as ut
 import numpy as np
 import math
+import time
 import sys
 
 
+class DSPWorker(Thread):
+    """Thread class computing microvolts and bands of raw blocks out of
+    the reader thread. Results are delivered to the GUI thread through
+    the queued Backend.rawReady signal. At most ``size`` blocks are
+    queued, the oldest one is dropped if full, and blocks are dropped
+    while the previous one is not rendered, so memory is bounded if GUI
+    falls behind"""
+    def __init__(self, backend, size=4, verbose=2):
+        Thread.__init__(self, name='DSPWorker', daemon=True)
+        self.backend = backend
+        self.queue = Queue(size)
+        self.verbose = verbose
+        self.dropped = 0
+
+    def put(self, block, ready):
+        """Queues a raw block, dropping the oldest one if queue is full"""
+        while True:
+            try:
+                self.queue.put_nowait((block, ready))
+                return
+            except Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except Empty:
+                    pass
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if not self.backend.acquire('raw'):
+                self.dropped += 1
+                continue
+            block, ready = item
+            try:
+                start = time.monotonic()
+                microvolts = np.array([ut.raw_to_microvolt(raw)
+                                       for raw in block])
+                bands = ut.microvolts_to_bands(microvolts)
+                if self.backend.tracer is not None:
+                    self.backend.tracer.span('gui:dsp', start,
+                                             time.monotonic())
+                self.backend.rawReady.emit(microvolts, bands, ready)
+            except Exception:
+                # Nothing emitted, next block can be rendered
+                self.backend.rendered['raw'].set()
+                raise
+
+    def stop(self):
+        self.queue.put(None)
+        self.join()
+        if self.dropped:
+            ut.log('warn', f"GUI behind, {self.dropped} raw blocks "
+                   f"dropped.", self.verbose)
+
+
 class BackendThread(Thread):
-    def __init__(self, root, backend, flag, address):
+    def __init__(self, root, backend, flag, address, tracer=None,
+                 verbose=2):
         Thread.__init__(self)
         self.root = root
         self.backend = backend
         self.flag = flag
         self.address = address
-        self.queue = Queue()
+        self.tracer = tracer
+        self.verbose = verbose
+        self.block = []
+        self.worker = None
 
     def run(self):
+        self.worker = DSPWorker(self.backend, verbose=self.verbose)
+        self.worker.start()
         self.mindwave = MindWave(address=self.address, autostart=False,
-                                 verbose=2)
+                                 verbose=self.verbose, tracer=self.tracer)
         ut.set_logger(self.root.newLineConsole)
-        self.mindwave.update_callback('eeg', self.send_eeg)
-        self.mindwave.update_callback('raw', self.send_raw)
-        self.mindwave.update_callback('attention', self.send_attention)
-        self.mindwave.update_callback('meditation', self.send_meditation)
+        self.mindwave.set_callback('eeg', self.send_eeg)
+        self.mindwave.set_callback('raw', self.send_raw)
+        self.mindwave.set_callback('attention', self.send_attention)
+        self.mindwave.set_callback('meditation', self.send_meditation)
         try:
             self.mindwave.start()
         except SystemExit:
+            self.worker.stop()
             self.root.enableStartButton.emit()
             sys.exit()
         self.flag.wait()
         self.mindwave.stop()
+        self.worker.stop()
 
     def send_eeg(self, eeg):
         if 0 in eeg.values():
             return
         try:
             data = {band: math.log(value) for band, value in eeg.items()}
-            self.backend.update_asic(data)
         except ValueError:
-            pass
+            return
+        if self.backend.acquire('asic'):
+            self.backend.asicReady.emit(data)
 
     def send_raw(self, raw):
-        self.queue.put(raw)
-        if self.queue.qsize() > ut.SAMPLE_RATE:
-            microvolts = [ut.raw_to_microvolt(self.queue.get())
-                          for d in range(ut.SAMPLE_RATE)]
-            self.backend.update_raw(microvolts)
+        if self.backend.ring is not None:
+            self.backend.ring.append(ut.raw_to_microvolt(raw))
+        self.block.append(raw)
+        if len(self.block) == ut.SAMPLE_RATE:
+            self.worker.put(self.block, time.monotonic())
+            self.block = []
 
     def send_attention(self, att):
         self.root.attUpdate.emit(att)
@@ -94,9 +164,19 @@ class Backend(QObject):
                      QBarSet, QBarSet,
                      QBarSet, QBarSet,
                      QBarSet, QBarSet)
+    # Emitted from worker threads, executed in GUI thread
+    rawReady = Signal(object, object, object)
+    asicReady = Signal(object)
 
-    def __init__(self):
+    def __init__(self, scrolling=False, fps=30, window=1, tracer=None):
         QObject.__init__(self)
+        self.tracer = tracer
+        self.rawReady.connect(self.update_raw, Qt.QueuedConnection)
+        self.asicReady.connect(self.update_asic, Qt.QueuedConnection)
+        # Set when last update was rendered, at most one queued update
+        self.rendered = {'raw': Event(), 'asic': Event()}
+        for rendered in self.rendered.values():
+            rendered.set()
         self.charts = {band: {'serie': None, 'axis': None}
                        for band in ut.EEG}
         self.charts['raw'] = {'serie': None, 'axis': None}
@@ -104,7 +184,33 @@ class Backend(QObject):
         self.polar = {band: idx for idx, band in enumerate(ut.NAMES[6:])}
         self.polar['serie'] = None
         self.time = np.arange(0, 1, 1/ut.SAMPLE_RATE)
-        self.idx = 0
+        # Reused QPointF buffers when bulk numpy transfer is not available
+        self.points = {chart: [QPointF() for _ in range(ut.SAMPLE_RATE + 1)]
+                       for chart in self.charts}
+        # Scrolling raw chart, refreshed by timer from latest samples
+        self.ring = None
+        self.timer = None
+        if scrolling:
+            self.window = window * ut.SAMPLE_RATE
+            self.ring = ut.RingBuffer(ut.SAMPLE_RATE * 4)
+            self.scrolled = 0
+            self.timer = QTimer(self)
+            self.timer.setInterval(1000 // fps)
+            self.timer.timeout.connect(self.scroll_raw)
+            self.timer.start()
+
+    def acquire(self, update):
+        """Reserves the queued update of GUI thread, called from worker
+        threads before emitting rawReady or asicReady
+        :param update: Update name: raw or asic
+        :type update: str
+        :return: False if previous update was not rendered yet
+        :rtype: bool"""
+        rendered = self.rendered[update]
+        if not rendered.is_set():
+            return False
+        rendered.clear()
+        return True
 
     @Slot(str, QLineSeries, QValueAxis)
     def store_new_chart(self, chart, serie, axis):
@@ -123,51 +229,96 @@ class Backend(QObject):
         for band, bar in zip(ut.NAMES[6:], bars):
             self.asic[band] = bar
 
-    def update_raw(self, microvolts):
-        bands = ut.microvolts_to_bands(microvolts)
-        points = {
-            'raw': [QPointF(x, y) for x, y in zip(self.time, microvolts)],
-            'delta': [QPointF(x, y) for x, y in zip(self.time, bands[0])],
-            'theta': [QPointF(x, y) for x, y in zip(self.time, bands[1])],
-            'alpha': [QPointF(x, y) for x, y in zip(self.time, bands[2])],
-            'beta': [QPointF(x, y) for x, y in zip(self.time, bands[3])],
-            'gamma': [QPointF(x, y) for x, y in zip(self.time, bands[4])]
-        }
-        minmax = {
-            'raw': ut.signal_axes(microvolts),
-            'delta': ut.signal_axes(bands[0]),
-            'theta': ut.signal_axes(bands[1]),
-            'alpha': ut.signal_axes(bands[2]),
-            'beta': ut.signal_axes(bands[3]),
-            'gamma': ut.signal_axes(bands[4])
-        }
-        for chart in points:
-            self.charts[chart]['axis'].setMin(minmax[chart][0])
-            self.charts[chart]['axis'].setMax(minmax[chart][1])
-            self.charts[chart]['serie'].replace(points[chart])
+    def chart_width(self, chart):
+        """Plot area width in pixels of a chart"""
+        serie = self.charts[chart]['serie']
+        if serie.chart() is not None:
+            return int(serie.chart().plotArea().width())
+        return ut.SAMPLE_RATE
 
-    def update_asic(self, data):
-        points = [QPointF(self.polar[band], data[band]) for band in data]
-        points.append(QPointF(8, data['delta']))
-        if self.idx == 0:
-            self.polar['serie'].append(points)
+    def replace_serie(self, chart, x, y):
+        """Replaces chart points, using numpy bulk transfer if available"""
+        serie = self.charts[chart]['serie']
+        if hasattr(serie, 'replaceNp'):
+            serie.replaceNp(x, y)
         else:
+            points = self.points[chart]
+            for point, px, py in zip(points, x, y):
+                point.setX(px)
+                point.setY(py)
+            serie.replace(points[:len(x)])
+
+    @Slot(object, object, object)
+    def update_raw(self, microvolts, bands=None, ready=None):
+        try:
+            start = time.monotonic()
+            if bands is None:
+                bands = ut.microvolts_to_bands(microvolts)
+            signals = dict(zip(ut.EEG, bands))
+            if self.ring is None:
+                signals['raw'] = microvolts
+            for chart, signal in signals.items():
+                idx, values = ut.decimate_minmax(signal,
+                                                 self.chart_width(chart))
+                self.charts[chart]['axis'].setMin(values.min())
+                self.charts[chart]['axis'].setMax(values.max())
+                self.replace_serie(chart, self.time[idx], values)
+            if self.tracer is not None:
+                end = time.monotonic()
+                self.tracer.span('gui:render', start, end)
+                if ready is not None:
+                    self.tracer.span('gui:e2e', ready, end)
+        finally:
+            # Next update is not dropped, even if this one failed
+            self.rendered['raw'].set()
+
+    @Slot()
+    def scroll_raw(self):
+        """Appends new samples to raw chart and removes the oldest ones"""
+        serie = self.charts['raw']['serie']
+        if serie is None:
+            return
+        count, values = self.ring.since(self.scrolled)
+        if not len(values):
+            return
+        self.scrolled = count
+        x = np.arange(count - len(values), count) / ut.SAMPLE_RATE
+        if hasattr(serie, 'appendNp'):
+            serie.appendNp(x, values)
+        else:
+            serie.append([QPointF(px, py) for px, py in zip(x, values)])
+        if serie.count() > self.window:
+            serie.removePoints(0, serie.count() - self.window)
+        for axis in serie.attachedAxes():
+            if axis.orientation() == Qt.Horizontal:
+                axis.setRange(x[-1] - self.window / ut.SAMPLE_RATE, x[-1])
+        shown = self.ring.last(self.window)
+        self.charts['raw']['axis'].setRange(shown.min(), shown.max())
+
+    @Slot(object)
+    def update_asic(self, data):
+        try:
+            points = [QPointF(self.polar[band], data[band]) for band in data]
+            points.append(QPointF(8, data['delta']))
+            # Points replaced, so polar serie keeps 9 points
             self.polar['serie'].replace(points)
-        self.polar['serie'].setColor(
-            self.asic[max(data, key=data.get)].color())
-        self.idx += 1
-        for band in data:
-            self.asic[band].replace(0, data[band])
+            self.polar['serie'].setColor(
+                self.asic[max(data, key=data.get)].color())
+            for band in data:
+                self.asic[band].replace(0, data[band])
+        finally:
+            self.rendered['asic'].set()
 
 
-def main(address=None):
+def main(address=None, scrolling=False, tracer=None, verbose=2):
     thread_flag = None
     thread = None
 
     def thread_start():
         nonlocal thread_flag, thread
         thread_flag = Event()
-        thread = BackendThread(main, backend, thread_flag, address)
+        thread = BackendThread(main, backend, thread_flag, address, tracer,
+                               verbose)
         thread.start()
 
     def thread_quit():
@@ -179,12 +330,12 @@ def main(address=None):
     app.setWindowIcon(QIcon(":/icon"))
     engine = QQmlApplicationEngine()
     engine.quit.connect(app.quit)
-    backend = Backend()
+    backend = Backend(scrolling, tracer=tracer)
     backend.newChart.connect(backend.store_new_chart)
     backend.newPolar.connect(backend.store_new_polar)
     backend.newBars.connect(backend.store_new_bars)
     engine.rootContext().setContextProperty('backend', backend)
-    engine.load('neuropy3/gui/gui.qml')
+    engine.load(str(Path(__file__).parent / 'gui.qml'))
     main = engine.rootObjects()[0]
     main.startThread.connect(thread_start)
     main.closing.connect(thread_quit)
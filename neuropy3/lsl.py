@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# lsl - Lab Streaming Layer outlet module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from neuropy3 import utils as ut
+from collections import deque
+
+
+STREAMS = {
+    'raw': {'type': 'EEG', 'channels': ['raw'],
+            'rate': ut.SAMPLE_RATE, 'format': 'float32'},
+    'eeg': {'type': 'EEGPower', 'channels': ut.NAMES[6:],
+            'rate': 0, 'format': 'float32'},
+    'esense': {'type': 'eSense', 'channels': ut.NAMES[1:4],
+               'rate': 0, 'format': 'float32'}
+}
+MAX_JITTER = 0.1  # seconds
+
+
+class PylslBackend:
+    """Creates outlets using pylsl (``pip install neuropy3[lsl]``).
+    pylsl local_clock and reader timestamps (time.monotonic) share the
+    same monotonic clock on linux"""
+    def __init__(self):
+        import pylsl
+        self.pylsl = pylsl
+
+    def outlet(self, name, stype, channels, rate, fmt, source_id):
+        """Creates a stream outlet
+        :return: Object with push_chunk(samples, timestamp) and
+                 push_sample(sample, timestamp) methods
+        :rtype: pylsl.StreamOutlet"""
+        info = self.pylsl.StreamInfo(name, stype, len(channels), rate,
+                                     fmt, source_id)
+        chns = info.desc().append_child('channels')
+        for channel in channels:
+            chns.append_child('channel').append_child_value('label', channel)
+        return self.pylsl.StreamOutlet(info)
+
+
+class LocalOutlet:
+    """In-process outlet, stores pushed samples for a LocalInlet"""
+    def __init__(self, name, stype, channels, rate, fmt, source_id):
+        self.name = name
+        self.type = stype
+        self.channels = channels
+        self.rate = rate
+        self.source_id = source_id
+        self.inlets = []
+
+    def push_chunk(self, samples, timestamp):
+        """Pushes several samples, timestamp is the last sample one"""
+        for idx, sample in enumerate(samples):
+            if self.rate:
+                stamp = timestamp - (len(samples) - 1 - idx) / self.rate
+            else:
+                stamp = timestamp
+            for inlet in self.inlets:
+                inlet.buffer.append((sample, stamp))
+
+    def push_sample(self, sample, timestamp):
+        """Pushes one sample"""
+        self.push_chunk([sample], timestamp)
+
+
+class LocalInlet:
+    """In-process stand-in of a stream inlet, see LocalBackend
+    :param outlet: Outlet to read from
+    :type outlet: LocalOutlet
+    :param maxlen: Maximum number of samples buffered
+    :type maxlen: int, optional. Default: 32768
+    """
+    def __init__(self, outlet, maxlen=32768):
+        self.outlet = outlet
+        self.buffer = deque(maxlen=maxlen)
+        outlet.inlets.append(self)
+
+    def pull_chunk(self):
+        """Pulls every buffered sample
+        :return: Samples and timestamps
+        :rtype: tuple(list, list)"""
+        samples, timestamps = [], []
+        while self.buffer:
+            sample, stamp = self.buffer.popleft()
+            samples.append(sample)
+            timestamps.append(stamp)
+        return samples, timestamps
+
+
+class LocalBackend:
+    """Creates in-process outlets, used to test or consume streams without
+    a Lab Streaming Layer installation"""
+    def __init__(self):
+        self.outlets = {}
+
+    def outlet(self, name, stype, channels, rate, fmt, source_id):
+        """Creates a stream outlet
+        :rtype: LocalOutlet"""
+        self.outlets[stype] = LocalOutlet(name, stype, channels, rate,
+                                          fmt, source_id)
+        return self.outlets[stype]
+
+    def inlet(self, stype):
+        """Opens an inlet of a created outlet
+        :param stype: Stream type: EEG, EEGPower or eSense
+        :type stype: str
+        :rtype: LocalInlet"""
+        return LocalInlet(self.outlets[stype])
+
+
+class LSLOutlet:
+    """Lab Streaming Layer outlet of MindWave data.
+    Used as MindWave sink, see ``MindWave.add_sink``.
+    Raw samples (microvolts) are pushed in chunks, EEG power and eSense
+    once per second. Raw timestamps are derived from sample count since
+    the earliest arrival, to remove bluetooth jitter.
+    :param backend: Outlet factory, see PylslBackend and LocalBackend
+    :type backend: object, optional. Default: PylslBackend
+    :param name: Stream name prefix
+    :type name: str, optional. Default: MindWave
+    :param source_id: Unique source identifier, e.g. headset address
+    :type source_id: str, optional. Default: neuropy3
+    :param chunk: Number of raw samples pushed at once
+    :type chunk: int, optional. Default: 32
+    """
+    def __init__(self, backend=None, name='MindWave', source_id='neuropy3',
+                 chunk=32):
+        if backend is None:
+            backend = PylslBackend()
+        self.chunk = chunk
+        self.outlets = {
+            stream: backend.outlet(
+                f"{name} {stream}", info['type'], info['channels'],
+                info['rate'], info['format'], f"{source_id}-{stream}")
+            for stream, info in STREAMS.items()}
+        self.raw = []
+        self.stamp = 0.
+        self.esense = dict.fromkeys(ut.NAMES[1:4], 0)
+        self.origin = None
+        self.samples = 0
+
+    def _raw_timestamp(self, timestamp):
+        """Timestamp of latest raw sample, derived from sample count"""
+        if self.origin is not None:
+            expected = self.origin + self.samples / ut.SAMPLE_RATE
+            if expected <= timestamp <= expected + MAX_JITTER:
+                return expected
+        # First sample, earlier arrival or gap: anchor to arrival time
+        self.origin = timestamp - self.samples / ut.SAMPLE_RATE
+        return timestamp
+
+    def flush(self):
+        """Pushes pending raw samples (a partial chunk when reader is
+        stopped), timestamped with the latest sample"""
+        if self.raw:
+            self.outlets['raw'].push_chunk(self.raw, self.stamp)
+            self.raw = []
+
+    def update(self, name, value, timestamp):
+        """Sink interface, see ``MindWave.add_sink``"""
+        if name == 'raw':
+            self.stamp = self._raw_timestamp(timestamp)
+            self.samples += 1
+            self.raw.append([ut.raw_to_microvolt(value)])
+            if len(self.raw) >= self.chunk:
+                self.flush()
+        elif name == 'eeg':
+            self.outlets['eeg'].push_sample(
+                [value[band] for band in ut.NAMES[6:]], timestamp)
+        elif name in self.esense:
+            self.esense[name] = value
+            # Meditation is the last eSense value of each packet
+            if name == 'meditation':
+                self.outlets['esense'].push_sample(
+                    list(self.esense.values()), timestamp)
@@ -23,13 +23,43 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from threading import Thread, Event
+from neuropy3.registry import Registry
+from neuropy3 import transport as tr
 from neuropy3 import utils as ut
 
-import bluetooth
-import struct
+import socket
+import time
 import sys
 
 
+MAX_BACKOFF = 30  # seconds
+# Reads wait at most POLL_TIMEOUT so stop requests are handled promptly,
+# connection is lost after LINK_TIMEOUT without data
+POLL_TIMEOUT = 0.25  # seconds
+LINK_TIMEOUT = 5  # seconds
+BUFFER_SIZE = 4096
+SYNC = ut.BYTE['sync'][0]
+STEPS = (ut.BYTE['step1'][0], ut.BYTE['step2'][0])
+SIGNAL = ut.BYTE['signal'][0]
+RAW = ut.BYTE['raw'][0]
+EEG = ut.BYTE['eeg'][0]
+MAX_SINGLE = ut.BYTE['_max'][0]
+SINGLE_NAMES = ut.NAMES[:5]
+BANDS = ut.NAMES[6:]
+
+
+class LinkLost(Exception):
+    """Raised by MindWaveReader when connection is lost"""
+
+
+class _Stopped(Exception):
+    """Raised by MindWaveReader reads when thread is stopped"""
+
+
+class _Ended(Exception):
+    """Raised by MindWaveReader reads when a replayed stream ends"""
+
+
 class MindWaveReader(Thread):
     """Thread class running in background. It reads every packet
     sent by NeuroSky MindWave Mobile 2 and updated MindWave class
@@ -41,119 +71,220 @@ class MindWaveReader(Thread):
     :type callbacks: dict
     :param flag: Event flag to stop thread on demand
     :type flag: threading.Event
-    :param socket: Bluetooth socket
-    :type socket: bluetooth.BluetoothSocket
+    :param transport: Opened byte stream of MindWave
+    :type transport: neuropy3.transport.Transport
     :param verbose: Verbose level
     :type verbose: int. Allowed values: 0-4
+    :param sinks: Shared sinks with MindWave class, every value
+                  updated is published with ``sink.update(name, value,
+                  timestamp)``
+    :type sinks: list, optional
+    :param supervisor: Function called when connection is lost, returns
+                       a new opened transport or None if reader must stop.
+                       If not present, reader exits on connection lost
+    :type supervisor: function, optional
+    :param tracer: Records latency of values, from bytes received to
+                   sinks and callbacks
+    :type tracer: neuropy3.trace.Tracer, optional
     """
-    def __init__(self, data, callbacks, flag, socket, verbose):
-        Thread.__init__(self)
+    def __init__(self, data, callbacks, flag, transport, verbose, sinks=None,
+                 supervisor=None, tracer=None):
+        Thread.__init__(self, name=type(self).__name__)
         self.data = data
         self.callbacks = callbacks
         self.flag = flag
-        self.socket = socket
+        self.transport = transport
         self.verbose = verbose
+        self.sinks = sinks if sinks is not None else []
+        self.supervisor = supervisor
+        self.tracer = tracer
         self.step = 0
         self.new = []
+        # Preallocated buffers, reused by every read
+        self.buffer = bytearray(BUFFER_SIZE)
+        self.view = memoryview(self.buffer)
+        self.offset = self.length = 0
+        self.payload = bytearray(ut.PLENGTH_MAX)
+        self.last_data = 0.
+        self.failed = False
 
     def run(self):
-        """Starts the read thread loop"""
+        """Starts the read thread loop. failed is set if the loop does
+        not end by stop (connection lost without supervisor or error)"""
+        self.failed = True
+        self.failed = not self._loop()
+
+    def _loop(self):
+        """Reads packets until stopped. Without transport (first
+        connection failed), supervisor connects first
+        :return: Whether loop ended by stop
+        :rtype: bool"""
+        if self.transport is None:
+            if not self._resume():
+                return True
+        else:
+            self.transport.settimeout(POLL_TIMEOUT)
+            self.last_data = time.monotonic()
         while not self.flag.is_set():
-            self._read_packet()
-
-    def _read(self, n_bytes=1):
-        """Reads bytes from bluetooth socket
-        :param n_bytes: Number of bytes to read
-        :type n_bytes: int, optional. Default: 1
-        :return: A bytearray read from bluetooth socket
-        :rtype: bytearray"""
-        self.socket.settimeout(5)
-        try:
-            return self.socket.recv(n_bytes)
-        except bluetooth.btcommon.BluetoothError:
-            ut.log('error', "Bluetooth timed out. Check headset is on.",
-                   self.verbose)
-            sys.exit(1)
-
-    def _b2i(self, value, n_bytes=1):
-        """Converts bytes to integer
-        Depending of the size of the bytes, integer can be signed
-        or unsigned. More info in thinkgear communications protocol
-        :param value: Value to be converted
-        :type value: bytearray
-        :param n_bytes: Number of bytes to be converted
-        :type n_bytes: int, optional. Allowed: 1, 2, 4. Default: 1
-        :return: Value after converting bytearray
+            try:
+                self._read_packet()
+            except _Stopped:
+                break
+            except _Ended:
+                ut.log('info', f"Replay of {self.transport} ended.",
+                       self.verbose)
+                break
+            except LinkLost as e:
+                if self.supervisor is None:
+                    ut.log('error', str(e), self.verbose)
+                    return False
+                ut.log('warn', str(e), self.verbose)
+                lost = time.monotonic()
+                if not self._resume():
+                    break
+                self._gap(time.monotonic() - lost)
+        return True
+
+    def _resume(self):
+        """Gets a new transport from supervisor, resetting read state:
+        bytes and partial packet of the previous connection are discarded
+        and connection steps are expected again
+        :return: Whether reader was reconnected (False if stopped)
+        :rtype: bool"""
+        self.transport = self.supervisor()
+        if self.transport is None:
+            return False
+        self.transport.settimeout(POLL_TIMEOUT)
+        self.last_data = time.monotonic()
+        self.offset = self.length = 0
+        self.step = 0
+        return True
+
+    def _gap(self, duration):
+        """Marks a gap in data after a reconnection
+        :param duration: Seconds without connection
+        :type duration: float"""
+        self.data['gaps'] += 1
+        ut.log('info', f"MindWave reconnected after {duration:.1f}s.",
+               self.verbose)
+        self._deliver('gap', duration)
+
+    def _fill(self):
+        """Reads available bytes from transport into the read buffer.
+        Waits in short reads, checking if thread was stopped"""
+        start = time.monotonic() if self.tracer is not None else 0.
+        while True:
+            try:
+                size = self.transport.recv_into(self.view)
+                break
+            except (socket.timeout, TimeoutError):
+                if self.flag.is_set():
+                    raise _Stopped
+                if time.monotonic() - self.last_data < LINK_TIMEOUT:
+                    continue
+                raise LinkLost(f"Connection with MindWave ({self.transport}) "
+                               f"timed out. Check headset is on.")
+            except OSError as e:
+                if self.flag.is_set():
+                    # Transport closed while stopping
+                    raise _Stopped
+                raise LinkLost(f"Connection with MindWave ({self.transport}) "
+                               f"lost: {e.strerror or e}")
+        # Arrival time of every value parsed from these bytes
+        self.last_data = time.monotonic()
+        if self.tracer is not None:
+            self.tracer.span('recv', start, self.last_data)
+        if not size:
+            if self.transport.replay:
+                raise _Ended
+            raise LinkLost(f"Connection with MindWave ({self.transport}) "
+                           f"closed.")
+        self.offset = 0
+        self.length = size
+
+    def _read(self):
+        """Reads next byte from read buffer, filling it if empty
+        :return: Byte read
         :rtype: int"""
-        vtype = '>B'
-        if n_bytes == 2:
-            vtype = '>h'
-        elif n_bytes == 4:
-            vtype = '>I'
-        return struct.unpack(vtype, value)[0]
-
-    def _read_eeg(self, values):
+        if self.offset == self.length:
+            self._fill()
+        value = self.buffer[self.offset]
+        self.offset += 1
+        return value
+
+    def _read_eeg(self, offset):
         """Parses ASIC_EEG_POWER payload to eeg bands
-        :param values: Packets to be parsed
-        :type values: bytearray"""
-        for idx, band in enumerate(ut.NAMES[6:]):
-            self.data['values']['eeg'][band] = self._b2i(
-                b'\x00' + b''.join(values[idx*3:idx*3+3]), 4)
-        if 'eeg' in self.callbacks:
-            self.callbacks['eeg'](self.data['values']['eeg'])
+        :param offset: Payload index of first eeg value
+        :type offset: int"""
+        payload = self.payload
+        for idx, band in enumerate(BANDS):
+            pos = offset + idx * 3
+            self.data['values']['eeg'][band] = (
+                payload[pos] << 16 | payload[pos + 1] << 8 | payload[pos + 2])
+        self._deliver('eeg', self.data['values']['eeg'])
 
     def _valid_payload(self):
-        """Checks payload length and checksum"""
-        valid = (False, None, 0)
-        plength = self._b2i(self._read())
+        """Reads payload into payload buffer, checking payload length
+        and checksum
+        :return: Payload length, 0 if packet is not valid
+        :rtype: int"""
+        plength = self._read()
         if plength >= ut.PLENGTH_MAX:
             ut.log('warn', "Packet length too large. Packet discarded.",
                    self.verbose)
-        else:
-            payload = []
-            chksum = 0
-            for idx in range(plength):
-                packet = self._read()
-                payload.append(packet)
-                chksum += self._b2i(packet)
-            checksum = self._b2i(self._read())
-            chksum = ~chksum & 0xFF
-            if chksum != checksum:
-                ut.log('warn', "Checksum failed. Packet discarded.",
-                       self.verbose)
-            else:
-                valid = (True, payload, plength)
-        return valid
+            return 0
+        payload = self.payload
+        # Checksum kept in a byte, so no integer is allocated
+        chksum = 0
+        for idx in range(plength):
+            value = self._read()
+            payload[idx] = value
+            chksum = (chksum + value) & 0xFF
+        checksum = self._read()
+        if ~chksum & 0xFF != checksum:
+            ut.log('warn', "Checksum failed. Packet discarded.",
+                   self.verbose)
+            return 0
+        return plength
 
     def _read_packet(self):
         """Reads packets and stores in shared data dict"""
         # Synchronize on SYNC bytes
-        if self._read() != ut.BYTE['sync']:
+        if self._read() != SYNC:
             return
-        if self._read() != ut.BYTE['sync']:
+        if self._read() != SYNC:
             return
-        valid, payload, plength = self._valid_payload()
-        if valid:
+        plength = self._valid_payload()
+        if plength:
+            payload = self.payload
             self.data['packets'] += 1
             idx = 0
             while idx < plength:
                 known = True
                 code = payload[idx]
-                ut.log('succ', f"Reading packet: {code}", self.verbose)
-                if code in (ut.BYTE['step1'], ut.BYTE['step2']):
+                if self.verbose > 3:
+                    ut.log('succ', f"Reading packet: {code:#04x}",
+                           self.verbose)
+                if code in STEPS:
                     self.step += 1
                     if self.step == 2:
                         ut.log('info',
                                "MindWave connection established.",
                                self.verbose)
                     return
-                elif code < ut.BYTE['_max']:
-                    idx += 1
+                idx += 1
+                if idx >= plength:
+                    ut.log('warn',
+                           f"Code {code:#04x} without value. "
+                           f"Packet discarded.",
+                           self.verbose)
+                    return
+                elif code < MAX_SINGLE:
                     value = payload[idx]
-                    if ut.CODE[code] in ut.NAMES[:5]:
-                        value = self._b2i(value)
-                        self._update(ut.CODE[code], value)
-                        if code == ut.BYTE['signal']:
+                    name = ut.CODE_INT.get(code)
+                    if name in SINGLE_NAMES:
+                        self._update(name, value)
+                        if code == SIGNAL:
                             if value == ut.NO_CONTACT:
                                 ut.log('warn',
                                        "MindWave electrodes are not in "
@@ -168,9 +299,14 @@ class MindWaveReader(Thread):
                     else:
                         known = False
                 else:
-                    idx += 1
-                    vlength = self._b2i(payload[idx])
-                    if code == ut.BYTE['raw']:
+                    vlength = payload[idx]
+                    if idx + vlength >= plength:
+                        ut.log('warn',
+                               f"Code {code:#04x} value out of payload. "
+                               f"Packet discarded.",
+                               self.verbose)
+                        return
+                    if code == RAW:
                         if vlength != ut.PKT_RAW_MAX:
                             ut.log('warn',
                                    f"RAW wrong number of bytes: "
@@ -178,10 +314,11 @@ class MindWaveReader(Thread):
                                    f"Packet discarded.",
                                    self.verbose)
                         else:
-                            value = self._b2i(
-                                b''.join(payload[idx+1:idx+1+vlength]), 2)
+                            value = payload[idx+1] << 8 | payload[idx+2]
+                            if value >= 0x8000:
+                                value -= 0x10000
                             self._update('raw', value)
-                    elif code == ut.BYTE['eeg']:
+                    elif code == EEG:
                         if vlength != ut.PKT_EEG_MAX:
                             ut.log('warn',
                                    f"EEG wrong number of bytes: "
@@ -189,13 +326,13 @@ class MindWaveReader(Thread):
                                    f"Packet discarded.",
                                    self.verbose)
                         else:
-                            self._read_eeg(payload[idx+1:idx+1+vlength])
+                            self._read_eeg(idx + 1)
                     else:
                         known = False
                     idx += vlength
                 if not known:
                     ut.log('warn',
-                           f"Code not recognized: {code}. "
+                           f"Code not recognized: {code:#04x}. "
                            f"Packet discarded.",
                            self.verbose)
                 idx += 1
@@ -207,27 +344,98 @@ class MindWaveReader(Thread):
         :param value: New value
         :type value: int"""
         self.data['values'][name] = value
+        self._deliver(name, value)
+
+    def _deliver(self, name, value):
+        """Publishes value in every sink and executes callback if present
+        :param name: Name of variable updated
+        :type name: str
+        :param value: New value
+        :type value: int or dict (eeg)"""
+        if self.tracer is not None and self.tracer.sampled(name):
+            self._deliver_traced(name, value)
+            return
+        self._publish(name, value)
         if name in self.callbacks:
             self.callbacks[name](value)
 
+    def _deliver_traced(self, name, value):
+        """_deliver recording latency spans, see neuropy3.trace"""
+        tracer = self.tracer
+        timestamp = time.monotonic()
+        tracer.span('parse', self.last_data, timestamp, name)
+        for sink in self.sinks:
+            start = time.monotonic()
+            sink.update(name, value, timestamp)
+            tracer.span(f'sink:{type(sink).__name__}', start,
+                        time.monotonic(), name)
+        if name in self.callbacks:
+            start = time.monotonic()
+            self.callbacks[name](value)
+            tracer.span(f'callback:{name}', start, time.monotonic(), name)
+        tracer.span('delivery', self.last_data, time.monotonic(), name)
+
+    def _publish(self, name, value):
+        """Publishes updated value in every sink
+        :param name: Name of variable updated
+        :type name: str
+        :param value: New value
+        :type value: int or dict (eeg)"""
+        if self.sinks:
+            timestamp = time.monotonic()
+            for sink in self.sinks:
+                sink.update(name, value, timestamp)
+
 
 class MindWave:
     """Main class. Interface to interact with read data from NeuroSky
     MindWave Mobile 2
-    :param address: Bluetooth address of NeuroSky MindWave Mobile 2
+    :param address: Bluetooth address of NeuroSky MindWave Mobile 2, or
+                    transport address: tcp:HOST:PORT, serial:PATH,
+                    /dev/rfcommN, file:PATH (see neuropy3.transport)
     :type address: str, optional
     :param autostart: Starts automatically MindWaveReader
     :type autostart: bool, optional. Default: True
     :param verbose: Verbose level
     :type verbose: int, optional. Allowed values: 0-4. Default: 1
+    :param shared: Publish data in shared memory (see neuropy3.shared).
+                   True uses default block name, a str sets block name
+    :type shared: bool or str, optional. Default: None
+    :param reconnect: Reconnect with exponential backoff when connection
+                      is lost (or cannot be established at first),
+                      keeping data, callbacks and sinks. Each
+                      reconnection is notified to 'gap' callback/sinks
+                      with the seconds without connection
+    :type reconnect: bool, optional. Default: False
+    :param cache: Use known headsets registry (see neuropy3.registry) to
+                  connect without scanning when address is not given
+    :type cache: bool, optional. Default: True
+    :param transport: Byte stream of MindWave, overrides address
+    :type transport: neuropy3.transport.Transport, optional
+    :param tracer: Records latency of every value (see neuropy3.trace)
+    :type tracer: neuropy3.trace.Tracer, optional
+    :param profiler: Profiles reader thread, including sinks and
+                     callbacks (see neuropy3.profiling)
+    :type profiler: neuropy3.profiling.Profiler, optional
     """
-    def __init__(self, address=None, autostart=True, verbose=1):
+    def __init__(self, address=None, autostart=True, verbose=1,
+                 shared=None, reconnect=False, cache=True, transport=None,
+                 tracer=None, profiler=None):
         self.address = address
+        self.source = transport
         self.verbose = verbose
+        self.shared = shared
+        self.reconnect = reconnect
+        self.tracer = tracer
+        self.profiler = profiler
+        self.registry = Registry(verbose=verbose) if cache else None
+        self.cached = False
         self._data = {
             'packets': 0,
+            'gaps': 0,
             'values': {
-                'signal': 0, 'attention': 0, 'meditation': 0, 'raw': 0,
+                'signal': 0, 'attention': 0, 'meditation': 0, 'blink': 0,
+                'raw': 0,
                 'eeg': {
                     'delta': 0, 'theta': 0,
                     'alpha_l': 0, 'alpha_h': 0,
@@ -237,48 +445,127 @@ class MindWave:
             }
         }
         self.callbacks = {}
+        self.sinks = []
+        self.publisher = None
         self.thread = None
-        self.socket = None
+        self.transport = None
         self.flag = Event()
         if autostart:
             self.start()
 
-    def scan(self):
-        """Scans bluetooth devices for MindWave Mobile address"""
-        if self.address is None:
+    def scan(self, cached=True):
+        """Scans bluetooth devices for MindWave Mobile address
+        :param cached: Use most recently seen headset of registry, if any,
+                       instead of scanning
+        :type cached: bool, optional. Default: True"""
+        if self.address is None and self.source is None:
+            if cached and self.registry is not None:
+                self.address = self.registry.latest()
+                if self.address is not None:
+                    self.cached = True
+                    ut.log('info',
+                           f"Using known MindWave Mobile ({self.address}).",
+                           self.verbose)
+                    return
             ut.log('info', "Scanning bluetooth devices...", self.verbose)
             try:
-                devices = {v: k for k, v in
-                           bluetooth.discover_devices(lookup_names=True)}
+                if self.registry is not None:
+                    devices = self.registry.scan()
+                else:
+                    import bluetooth
+                    devices = [(address, name) for address, name in
+                               bluetooth.discover_devices(lookup_names=True)
+                               if name is not None and
+                               name.startswith('MindWave Mobile')]
             except OSError:
                 ut.log('error',
                        "Could not use bluetooth. Check bluetooth is on.",
                        self.verbose)
                 sys.exit(1)
             else:
-                if 'MindWave Mobile' not in devices:
+                if not devices:
                     ut.log('error',
                            "Could not find MindWave Mobile device. "
                            "Check that headset is on.", self.verbose)
                     sys.exit(1)
                 else:
-                    self.address = devices['MindWave Mobile']
+                    self.address = devices[0][0]
+                    if len(devices) > 1:
+                        ut.log('warn',
+                               f"Found {len(devices)} MindWave Mobile "
+                               f"devices, using {self.address}.",
+                               self.verbose)
 
     def connect(self):
-        """Establishes connection with MindWave Mobile"""
-        if self.socket is None:
+        """Establishes connection with MindWave Mobile. If it fails with
+        reconnect, reader connects later with backoff"""
+        if self.transport is None:
             try:
                 ut.log('info',
                        f"Connecting to MindWave Mobile "
-                       f"({self.address})...",
+                       f"({self.source or self.address})...",
                        self.verbose)
-                self.socket = bluetooth.BluetoothSocket()
-                self.socket.connect((self.address, 1))
-            except bluetooth.btcommon.BluetoothError as e:
+                self.transport = self._open_transport()
+            except OSError as e:
+                if self.cached:
+                    # Known headset not available, look for others
+                    ut.log('warn',
+                           f"Could not connect to known MindWave Mobile: "
+                           f"{e.strerror or e}", self.verbose)
+                    self.cached = False
+                    self.address = None
+                    self.scan(cached=False)
+                    return self.connect()
+                if self.reconnect:
+                    # Reader retries with backoff (see _reconnect)
+                    ut.log('warn',
+                           f"Could not connect to MindWave Mobile: "
+                           f"{e.strerror or e}. Retrying.", self.verbose)
+                    return
                 ut.log('error',
                        f"Could not connect to MindWave Mobile: "
-                       f"{e.strerror}", self.verbose)
+                       f"{e.strerror or e}", self.verbose)
                 sys.exit(1)
+            if (self.registry is not None
+                    and isinstance(self.transport, tr.BluetoothTransport)):
+                self.registry.register(self.address)
+                self.registry.save()
+
+    def _open_transport(self):
+        """Opens the byte stream of MindWave Mobile: transport parameter,
+        or the one built from address
+        :return: Opened transport
+        :rtype: neuropy3.transport.Transport"""
+        transport = self.source
+        if transport is None:
+            transport = tr.from_address(self.address)
+        transport.open()
+        return transport
+
+    def _reconnect(self):
+        """Reader supervisor. Reconnects to MindWave Mobile, waiting
+        between attempts with exponential backoff
+        :return: New opened transport or None if reader was stopped
+        :rtype: neuropy3.transport.Transport"""
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        delay = 1
+        while not self.flag.wait(delay):
+            ut.log('info',
+                   f"Reconnecting to MindWave Mobile "
+                   f"({self.source or self.address})...",
+                   self.verbose)
+            try:
+                self.transport = self._open_transport()
+                return self.transport
+            except OSError as e:
+                ut.log('warn',
+                       f"Could not reconnect to MindWave Mobile: "
+                       f"{e.strerror or e}. Retrying in "
+                       f"{min(delay * 2, MAX_BACKOFF)}s.", self.verbose)
+                delay = min(delay * 2, MAX_BACKOFF)
+        return None
 
     def start_reader(self):
         """Starts reader thread"""
@@ -286,9 +573,22 @@ class MindWave:
             ut.log('warn', "Background thread already started.", self.verbose)
         else:
             self.flag.clear()
-            self.thread = MindWaveReader(self._data, self.callbacks,
-                                         self.flag, self.socket,
-                                         self.verbose)
+            if self.shared and self.publisher is None:
+                from neuropy3.shared import SharedPublisher
+                if isinstance(self.shared, str):
+                    self.publisher = SharedPublisher(self.shared)
+                else:
+                    self.publisher = SharedPublisher()
+                ut.log('info',
+                       f"Publishing data in shared memory "
+                       f"({self.publisher.name}).", self.verbose)
+                self.add_sink(self.publisher)
+            self.thread = MindWaveReader(
+                self._data, self.callbacks, self.flag, self.transport,
+                self.verbose, self.sinks,
+                self._reconnect if self.reconnect else None, self.tracer)
+            if self.profiler is not None:
+                self.profiler.attach(self.thread)
             self.thread.start()
 
     def start(self):
@@ -299,13 +599,19 @@ class MindWave:
         self.start_reader()
 
     def stop(self):
-        """Stops the reader thread"""
-        if self.thread is not None and self.thread.is_alive():
+        """Stops the reader thread, within a read poll (POLL_TIMEOUT).
+        Sinks received every value read before returning"""
+        if self.thread is not None:
             self.flag.set()
             self.thread.join()
             self.thread = None
-            self.socket.close()
-            self.socket = None
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        if self.publisher is not None:
+            self.remove_sink(self.publisher)
+            self.publisher.close()
+            self.publisher = None
 
     def set_callback(self, target, callback):
         """Define callback function for a given target
@@ -326,15 +632,38 @@ class MindWave:
         if target in self.callbacks:
             del self.callbacks[target]
 
+    def add_sink(self, sink):
+        """Publish every updated value in a sink
+        Unlike callbacks, any number of sinks can be attached
+
+        :param sink: An object with method ``update(name, value, timestamp)``,
+                     where timestamp is the reader ``time.monotonic()``
+                     when value was received.
+        :type sink: object"""
+        if sink not in self.sinks:
+            self.sinks.append(sink)
+
+    def remove_sink(self, sink):
+        """Stop publishing values in a sink
+
+        :param sink: The sink to be removed
+        :type sink: object"""
+        if sink in self.sinks:
+            self.sinks.remove(sink)
+
     def received(self):
         """Total packets received (and valid)"""
-        return self.data['packets']
+        return self._data['packets']
+
+    def gaps(self):
+        """Total reconnections after connection lost"""
+        return self._data['gaps']
 
     def data(self, name):
         """Current value of variable
         :param name: Name of variable to request.
         :type name: str. Allowed values: signal, attention, meditation,
-                         raw, eeg
+                         blink, raw, eeg
         :return: Value of requested variable
         :rtype: int
         """
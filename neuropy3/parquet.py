@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# parquet - Parquet recording and export module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# pyarrow is imported when first used (``pip install neuropy3[parquet]``)
+
+from neuropy3 import utils as ut
+from pathlib import Path
+from array import array
+
+import numpy as np
+
+
+# One row per raw sample or value, columns of other streams are null
+VALUES = {
+    'signal': 'uint8',
+    'attention': 'uint8',
+    'meditation': 'uint8',
+    'blink': 'uint8',
+    **{band: 'uint32' for band in ut.NAMES[6:]},
+    'gap': 'float64'
+}
+EXTENSION = '.parquet'
+
+
+def schema():
+    """Arrow schema of session tables: timestamp (float64,
+    time.monotonic), raw (int16), microvolts (float32), eSense values
+    (uint8), eeg power per band (uint32) and reconnection gaps (float64)
+    :rtype: pyarrow.Schema"""
+    import pyarrow as pa
+
+    fields = [pa.field('timestamp', pa.float64(), nullable=False),
+              pa.field('raw', pa.int16()),
+              pa.field('microvolts', pa.float32())]
+    fields += [pa.field(name, getattr(pa, kind)())
+               for name, kind in VALUES.items()]
+    return pa.schema(fields)
+
+
+class ParquetWriter:
+    """Writes MindWave streams to a Parquet file, a row group every
+    ``block`` seconds. The file is readable once closed (footer).
+    Use it with neuropy3.recorder.Recorder (see ``Recorder.add_session``)
+    to write from a background thread, or as MindWave sink.
+    :param path: Parquet file path
+    :type path: str
+    :param block: Seconds per row group
+    :type block: float, optional. Default: 60
+    :param compression: Parquet compression codec
+    :type compression: str, optional. Default: zstd
+    """
+    def __init__(self, path, block=60, compression='zstd'):
+        import pyarrow.parquet as pq
+
+        self.path = path
+        self.block = block
+        self.schema = schema()
+        self.writer = pq.ParquetWriter(path, self.schema,
+                                       compression=compression)
+        self.rows = 0
+        self._reset()
+
+    def _reset(self):
+        self.times = array('d')
+        self.raw = array('h')
+        self.valid = array('B')
+        self.values = {name: ([], []) for name in VALUES}
+
+    def append(self, name, values, timestamp):
+        """Appends values of a stream
+        :param name: Stream name, see neuropy3.session.STREAMS
+        :type name: str
+        :param values: Consecutive raw samples, eeg power per band or a
+                       single value
+        :type values: array.array or numpy.ndarray or list or tuple
+        :param timestamp: Timestamp of value (first raw sample)
+        :type timestamp: float"""
+        if name == 'raw':
+            if len(values) == 1:
+                self.times.append(timestamp)
+                self.raw.append(values[0])
+                self.valid.append(1)
+            else:
+                self.times.frombytes(
+                    (timestamp + np.arange(len(values)) / ut.SAMPLE_RATE)
+                    .tobytes())
+                self.raw.frombytes(
+                    np.asarray(values, dtype=np.int16).tobytes())
+                self.valid.frombytes(b'\x01' * len(values))
+        else:
+            columns = ut.NAMES[6:] if name == 'eeg' else [name]
+            for column, value in zip(columns, values):
+                self.values[column][0].append(len(self.times))
+                self.values[column][1].append(value)
+            self.times.append(timestamp)
+            self.raw.append(0)
+            self.valid.append(0)
+        # Time covered by pending rows, including last sample period
+        if (self.times[-1] - self.times[0] + 1 / ut.SAMPLE_RATE
+                >= self.block):
+            self._write_group()
+
+    def write(self, record):
+        """Writes a record
+        :param record: Value name, value and timestamp
+        :type record: tuple(str, int or tuple or float, float)"""
+        name, value, timestamp = record
+        if name in ('raw', 'eeg') or name in VALUES:
+            if isinstance(value, dict):
+                value = tuple(value.values())
+            elif not isinstance(value, tuple):
+                value = (value,)
+            self.append(name, value, timestamp)
+
+    def update(self, name, value, timestamp):
+        """Sink interface, see ``MindWave.add_sink``"""
+        self.write((name, value, timestamp))
+
+    def table(self):
+        """Pending rows as an Arrow table
+        :rtype: pyarrow.Table"""
+        import pyarrow as pa
+
+        rows = len(self.times)
+        null = np.frombuffer(self.valid, dtype=np.uint8) == 0
+        raw = np.frombuffer(self.raw, dtype=np.int16)
+        columns = [pa.array(np.frombuffer(self.times, dtype=np.float64)),
+                   pa.array(raw, mask=null),
+                   pa.array(ut.raw_to_microvolts(raw).astype(np.float32),
+                            mask=null)]
+        for name, kind in VALUES.items():
+            idx, values = self.values[name]
+            column = np.zeros(rows, dtype=kind)
+            column[idx] = values
+            mask = np.ones(rows, dtype=bool)
+            mask[idx] = False
+            columns.append(pa.array(column, mask=mask))
+        return pa.Table.from_arrays(columns, schema=self.schema)
+
+    def _write_group(self):
+        if self.times:
+            table = self.table()
+            self.writer.write_table(table, row_group_size=table.num_rows)
+            self.rows += table.num_rows
+            self._reset()
+
+    def flush(self):
+        """Rows are written per row group, see ``block``. Writing
+        pending rows earlier would only add small row groups, the file is
+        not readable before ``close`` anyway"""
+
+    def close(self):
+        """Writes pending rows and closes file"""
+        if self.writer is not None:
+            self._write_group()
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export(path, output, block=60):
+    """Exports a recording to Parquet. Session files (.np3) keep every
+    stream, other recordings (see neuropy3.batch.LOADERS) only have raw
+    values, timestamped from the sample rate
+    :param path: Recording file
+    :type path: str
+    :param output: Output directory, stores <recording>.parquet
+    :type output: str
+    :param block: Seconds per row group
+    :type block: float, optional. Default: 60
+    :return: Parquet file and rows written
+    :rtype: tuple(str, int)"""
+    from neuropy3.session import SessionReader, EXTENSION as SESSION
+    from neuropy3.batch import LOADERS
+
+    path = Path(path)
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    target = output / f'{path.stem}{EXTENSION}'
+    with ParquetWriter(target, block) as writer:
+        if path.suffix == SESSION:
+            for timestamp, name, values in SessionReader(path).records():
+                writer.append(name, values, timestamp)
+        else:
+            raw = LOADERS[path.suffix](path)
+            step = int(block * ut.SAMPLE_RATE)
+            for start in range(0, len(raw), step):
+                writer.append('raw', raw[start:start + step],
+                              start / ut.SAMPLE_RATE)
+    return str(target), writer.rows
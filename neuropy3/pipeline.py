@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# pipeline - Configurable streaming pipeline module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from neuropy3.features import FeatureExtractor
+from queue import Queue, Empty, Full
+from neuropy3 import server as sv
+from neuropy3 import utils as ut
+from collections import deque
+from threading import Thread
+from pathlib import Path
+from array import array
+
+import numpy as np
+import struct
+import json
+import time
+import os
+
+
+# Pipelines are a source (MindWave value), processing stages and outputs:
+# raw | microvolts | bands rate=4 | power > file path=power.bin + tcp
+# Items flowing between stages are (timestamp, numpy.ndarray, acquired):
+# timestamp of the first raw sample and acquisition time of the newest
+# value used (time.monotonic)
+RECORD = struct.Struct('<dH')  # Binary file: timestamp, values
+INPUTS = ut.NAMES[1:6] + ['eeg']
+
+
+class Source:
+    """Pipeline input, used as MindWave sink (see ``MindWave.add_sink``).
+    Runs in reader thread, only groups raw samples in blocks and
+    enqueues them in the first stage.
+    :param name: MindWave value, see ``MindWave.data``
+    :type name: str, optional. Default: raw
+    :param block: Raw samples per item
+    :type block: int, optional. Default: 32
+    """
+    stage = 'source'
+
+    def __init__(self, name='raw', block=32):
+        if name not in INPUTS:
+            raise ValueError(f"Unknown pipeline input: {name}")
+        self.name = name
+        self.block = block
+        self.raw = array('h')
+        self.first = self.last = 0.
+        self.outputs = []
+        self.count = 0
+        self.started = None
+
+    def update(self, name, value, timestamp):
+        """Sink interface, see ``MindWave.add_sink``"""
+        if name != self.name:
+            return
+        if self.started is None:
+            self.started = time.monotonic()
+        if name == 'raw':
+            if not self.raw:
+                self.first = timestamp
+            self.raw.append(value)
+            self.last = timestamp
+            if len(self.raw) >= self.block:
+                self.flush()
+        elif name == 'eeg':
+            self._put((timestamp, np.array([value[band]
+                                            for band in ut.NAMES[6:]]),
+                       timestamp))
+        else:
+            self._put((timestamp, np.array([value]), timestamp))
+
+    def flush(self):
+        """Enqueues pending raw samples as a (possibly partial) block"""
+        if self.raw:
+            self._put((self.first, np.array(self.raw, dtype=np.int16),
+                       self.last))
+            self.raw = array('h')
+
+    def _put(self, item):
+        self.count += 1
+        for output in self.outputs:
+            output.put(item)
+
+    def stats(self):
+        """Items produced per second"""
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return {'items': self.count,
+                'throughput': self.count / elapsed if elapsed else 0.}
+
+
+class Stage(Thread):
+    """Thread class running a pipeline stage. Items are received in a
+    bounded queue (dropped if full, reader never blocks), processed and
+    forwarded to next stages. Subclasses implement ``process``.
+    Measures throughput, processing latency and delay since acquisition
+    of the newest value of every item processed.
+    :param size: Maximum number of items queued
+    :type size: int, optional. Default: 256
+    """
+    stage = 'stage'
+
+    def __init__(self, size=256):
+        Thread.__init__(self, name=f'pipeline:{self.stage}', daemon=True)
+        self.queue = Queue(size)
+        self.outputs = []
+        self.tracer = None
+        self.running = True
+        self.count = 0
+        self.produced = 0
+        self.dropped = 0
+        self.busy = 0.
+        self.started = None
+        self.latency = deque(maxlen=1024)
+        self.delay = deque(maxlen=1024)
+
+    def put(self, item):
+        """Enqueues an item"""
+        try:
+            self.queue.put_nowait(item)
+        except Full:
+            self.dropped += 1
+
+    def process(self, timestamp, data):
+        """Processes an item
+        :param timestamp: Item timestamp
+        :type timestamp: float
+        :param data: Item data
+        :type data: numpy.ndarray
+        :return: Items (timestamp, data) for next stages
+        :rtype: list of tuple(float, numpy.ndarray)"""
+        raise NotImplementedError
+
+    def run(self):
+        """Processes queued items until stage is stopped"""
+        while self.running or not self.queue.empty():
+            try:
+                timestamp, data, acquired = self.queue.get(timeout=0.1)
+            except Empty:
+                continue
+            if self.started is None:
+                self.started = time.monotonic()
+            start = time.perf_counter()
+            items = self.process(timestamp, data)
+            elapsed = time.perf_counter() - start
+            self.busy += elapsed
+            self.latency.append(elapsed)
+            self.count += 1
+            self.delay.append(time.monotonic() - acquired)
+            if self.tracer is not None:
+                end = time.monotonic()
+                self.tracer.span(f'pipeline:{self.stage}', end - elapsed, end)
+                self.tracer.span(f'pipeline:{self.stage}:e2e', acquired, end)
+            for timestamp, data in items:
+                self.produced += 1
+                for output in self.outputs:
+                    output.put((timestamp, data, acquired))
+
+    def stop(self):
+        """Processes queued items and stops stage"""
+        self.running = False
+        if self.is_alive():
+            self.join()
+        self.close()
+
+    def close(self):
+        """Releases stage resources"""
+
+    def stats(self):
+        """Stage metrics: items received, produced and dropped, items
+        processed per second, fraction of time busy, processing latency
+        and delay since acquisition percentiles (milliseconds)
+        :rtype: dict"""
+        elapsed = time.monotonic() - self.started if self.started else 0
+        return {
+            'items': self.count,
+            'produced': self.produced,
+            'dropped': self.dropped,
+            'throughput': self.count / elapsed if elapsed else 0.,
+            'busy': self.busy / elapsed if elapsed else 0.,
+            'latency': {key: value * 1e3 for key, value in
+                        ut.percentiles(list(self.latency)).items()},
+            'delay': {key: value * 1e3 for key, value in
+                      ut.percentiles(list(self.delay)).items()}
+        }
+
+
+class Microvolts(Stage):
+    """Raw values to microvolts, see ``utils.raw_to_microvolt``"""
+    stage = 'microvolts'
+
+    def process(self, timestamp, data):
+        return [(timestamp, ut.raw_to_microvolts(data))]
+
+
+class _Windowed(Stage):
+    """Stage processing sliding windows of samples, ``rate`` windows per
+    second
+    :param window: Samples per window
+    :type window: int, optional. Default: 512 (1 second)
+    :param rate: Windows per second
+    :type rate: float, optional. Default: 4
+    """
+    def __init__(self, window=ut.SAMPLE_RATE, rate=4, size=256):
+        Stage.__init__(self, size)
+        self.window = window
+        self.hop = max(1, int(ut.SAMPLE_RATE / rate))
+        self.ring = ut.RingBuffer(window)
+        self.pending = 0
+
+    def process(self, timestamp, data):
+        items = []
+        for idx, value in enumerate(data):
+            self.ring.append(value)
+            self.pending += 1
+            if self.pending >= self.hop and self.ring.count >= self.window:
+                self.pending = 0
+                # Timestamp of the first sample of the window
+                first = (timestamp + (idx + 1 - self.window)
+                         / ut.SAMPLE_RATE)
+                items.append((first, self.compute(self.ring.last(
+                    self.window))))
+        return items
+
+    def compute(self, window):
+        """Processes a window
+        :rtype: numpy.ndarray"""
+        raise NotImplementedError
+
+
+class Bands(_Windowed):
+    """Filter bank, band signals of every window (rows in utils.EEG
+    order), see ``utils.microvolts_to_bands``"""
+    stage = 'bands'
+
+    def compute(self, window):
+        return np.array(ut.microvolts_to_bands(window))
+
+
+class Power(Stage):
+    """Mean power (uV^2) of every band signal"""
+    stage = 'power'
+
+    def process(self, timestamp, data):
+        return [(timestamp, np.mean(np.square(data), axis=-1))]
+
+
+class Features(_Windowed):
+    """Band power features of every window, see
+    neuropy3.features.FeatureExtractor"""
+    stage = 'features'
+
+    def __init__(self, window=ut.SAMPLE_RATE, rate=4, size=256):
+        _Windowed.__init__(self, window, rate, size)
+        self.extractor = FeatureExtractor(window)
+
+    def compute(self, window):
+        return self.extractor.vector(self.extractor.compute(window))
+
+
+class FileOutput(Stage):
+    """Writes items to a file, values are flattened
+    binary: timestamp (float64), count (uint16), values (float32 * count)
+    csv: timestamp and values, comma separated
+    :param path: Output file path
+    :type path: str
+    :param format: File format
+    :type format: str, optional. Allowed values: binary, csv.
+                  Default: binary
+    """
+    stage = 'file'
+
+    def __init__(self, path, format='binary', size=256):
+        Stage.__init__(self, size)
+        if format not in ('binary', 'csv'):
+            raise ValueError(f"Unknown file format: {format}")
+        self.format = format
+        self.file = open(path, 'wb' if format == 'binary' else 'w')
+
+    def process(self, timestamp, data):
+        values = np.ravel(data)
+        if self.format == 'binary':
+            self.file.write(RECORD.pack(timestamp, len(values)))
+            self.file.write(values.astype('<f4').tobytes())
+        else:
+            self.file.write(f'{timestamp},{",".join(map(str, values))}\n')
+        return []
+
+    def close(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+class TCPOutput(Stage):
+    """Streams items to clients of a streaming server (see
+    neuropy3.server), as vector messages
+    :param address: Address in the form tcp:HOST:PORT or unix:PATH
+    :type address: str, optional. Default: tcp:127.0.0.1:7358
+    """
+    stage = 'tcp'
+
+    def __init__(self, address='tcp:127.0.0.1:7358', size=256):
+        Stage.__init__(self, size)
+        self.server = sv.StreamServer(address, verbose=0)
+        self.server.start()
+
+    def process(self, timestamp, data):
+        self.server.broadcast(sv.frame(
+            sv.MSG['vector'],
+            sv.TIMESTAMP.pack(timestamp)
+            + np.ravel(data).astype('<f4').tobytes()))
+        return []
+
+    def close(self):
+        self.server.stop()
+
+
+STAGES = {stage.stage: stage for stage in
+          (Microvolts, Bands, Power, Features)}
+OUTPUTS = {output.stage: output for output in (FileOutput, TCPOutput)}
+
+
+def _element(text):
+    """Parses a spec element: name key=value ..."""
+    name, *params = text.split()
+    options = {}
+    for param in params:
+        key, _, value = param.partition('=')
+        try:
+            options[key] = json.loads(value)
+        except ValueError:
+            options[key] = value
+    return name, options
+
+
+def parse(spec):
+    """Parses a pipeline spec:
+    [input |] stage [options] | ... > output [options] + ...
+    e.g. raw | microvolts | bands rate=4 | power > file path=power.bin
+    :param spec: Pipeline spec
+    :type spec: str
+    :return: Pipeline config, see ``Pipeline``
+    :rtype: dict"""
+    chain, _, outputs = spec.partition('>')
+    stages = [_element(text) for text in chain.split('|') if text.strip()]
+    config = {'input': 'raw', 'stages': [], 'outputs': []}
+    if stages and stages[0][0] in INPUTS:
+        name, options = stages.pop(0)
+        config['input'] = name
+        config.update(options)
+    config['stages'] = [{'stage': name, **options}
+                        for name, options in stages]
+    config['outputs'] = [{'output': name, **options}
+                         for name, options in
+                         (_element(text) for text in outputs.split('+')
+                          if text.strip())]
+    return config
+
+
+def load(config):
+    """Loads a pipeline config from a JSON or YAML (requires PyYAML)
+    file, or a pipeline spec (see ``parse``)
+    :param config: Config file path or pipeline spec
+    :type config: str
+    :rtype: dict"""
+    path = Path(config)
+    if path.suffix in ('.json', '.yaml', '.yml') and path.is_file():
+        with open(path) as f:
+            if path.suffix == '.json':
+                return json.load(f)
+            import yaml
+            return yaml.safe_load(f)
+    return parse(config)
+
+
+class Pipeline:
+    """Streaming pipeline built from a config:
+    {"input": "raw", "block": 32,
+     "stages": [{"stage": "microvolts"}, {"stage": "bands", "rate": 4},
+                {"stage": "power"}],
+     "outputs": [{"output": "file", "path": "power.bin"},
+                 {"output": "tcp", "address": "tcp:127.0.0.1:7358"}]}
+    The source runs in the reader thread, every stage and output in its
+    own thread (NumPy and SciPy release the GIL while computing).
+    Every output receives the items of the last stage.
+    :param config: Pipeline config, see ``load``
+    :type config: dict
+    :param verbose: Verbose level
+    :type verbose: int, optional. Allowed values: 0-4. Default: 1
+    :param tracer: Records processing and end to end latency of every
+                   stage (see neuropy3.trace)
+    :type tracer: neuropy3.trace.Tracer, optional
+    """
+    def __init__(self, config, verbose=1, tracer=None):
+        self.verbose = verbose
+        self.source = Source(config.get('input', 'raw'),
+                             config.get('block', 32))
+        self.stages = []
+        for options in config.get('stages', []):
+            options = dict(options)
+            name = options.pop('stage')
+            if name not in STAGES:
+                raise ValueError(f"Unknown pipeline stage: {name}")
+            self.stages.append(STAGES[name](**options))
+        self.outputs = []
+        for options in config.get('outputs', []):
+            options = dict(options)
+            name = options.pop('output')
+            if name not in OUTPUTS:
+                raise ValueError(f"Unknown pipeline output: {name}")
+            self.outputs.append(OUTPUTS[name](**options))
+        for stage in self.stages + self.outputs:
+            stage.tracer = tracer
+        previous = self.source
+        for stage in self.stages:
+            previous.outputs.append(stage)
+            previous = stage
+        previous.outputs.extend(self.outputs)
+
+    def start(self):
+        """Starts every stage"""
+        for stage in self.stages + self.outputs:
+            stage.start()
+
+    def stop(self):
+        """Enqueues pending raw samples, processes queued items and
+        stops every stage, in order"""
+        self.source.flush()
+        for stage in self.stages + self.outputs:
+            stage.stop()
+
+    def update(self, name, value, timestamp):
+        """Sink interface, see ``MindWave.add_sink``"""
+        self.source.update(name, value, timestamp)
+
+    def stats(self):
+        """Metrics of every stage, see ``Stage.stats``
+        :return: Stage name and metrics, in pipeline order
+        :rtype: list of tuple(str, dict)"""
+        return ([(self.source.stage, self.source.stats())]
+                + [(stage.stage, stage.stats())
+                   for stage in self.stages + self.outputs])
+
+    def report(self):
+        """Logs metrics of every stage"""
+        for name, stats in self.stats():
+            if 'latency' not in stats:
+                ut.log('info', f"{name}: {stats['items']} items, "
+                       f"{stats['throughput']:.1f} items/s.", self.verbose)
+                continue
+            ut.log('info', f"{name}: {stats['items']} items "
+                   f"({stats['dropped']} dropped), "
+                   f"{stats['throughput']:.1f} items/s, "
+                   f"busy {stats['busy']:.1%}, latency "
+                   f"p50 {stats['latency']['p50']:.3f}ms "
+                   f"p95 {stats['latency']['p95']:.3f}ms, delay "
+                   f"p50 {stats['delay']['p50']:.1f}ms "
+                   f"p95 {stats['delay']['p95']:.1f}ms.", self.verbose)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# profiling - Reader and dispatch threads profiling module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from threading import Event, Lock, Thread
+from collections import Counter
+
+import cProfile
+import pstats
+import sys
+import io
+
+
+MODES = ('deterministic', 'sampling')
+# Since 3.12 a profile (sys.monitoring) covers every thread, and only one
+# can be active at a time
+SHARED_PROFILE = sys.version_info >= (3, 12)
+
+
+def _function(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})'
+
+
+class Profiler:
+    """Profiles threads attached before they are started, e.g. MindWave
+    reader (see ``MindWave`` profiler parameter), pipeline stages or
+    recorder.
+    deterministic: every call is measured with cProfile, profile is
+    stored as pstats file (snakeviz, ``python -m pstats``). Since Python
+    3.12 a single profile is active while any attached thread runs, and
+    it also measures other threads.
+    sampling: stacks of attached threads are sampled every ``interval``
+    seconds, lower overhead, profile is stored as collapsed stacks
+    (flamegraph.pl, speedscope).
+    :param mode: Profiling mode
+    :type mode: str, optional. Allowed values: deterministic, sampling.
+                Default: deterministic
+    :param interval: Seconds between samples (sampling)
+    :type interval: float, optional. Default: 0.005
+    """
+    def __init__(self, mode='deterministic', interval=0.005):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        self.mode = mode
+        self.interval = interval
+        self.lock = Lock()
+        self.stats = None
+        self.profile = None
+        self.running = 0
+        self.threads = []
+        self.stacks = Counter()
+        self.samples = 0
+        self.flag = Event()
+        self.sampler = None
+
+    def attach(self, thread):
+        """Profiles a thread, must be called before it is started
+        :param thread: Thread to be profiled
+        :type thread: threading.Thread"""
+        self.threads.append(thread)
+        if self.mode == 'deterministic':
+            thread.run = self._profiled(thread.run)
+        elif self.sampler is None:
+            self.sampler = Thread(target=self._sample, name='Profiler',
+                                  daemon=True)
+            self.sampler.start()
+
+    def _profiled(self, run):
+        if SHARED_PROFILE:
+            return self._shared(run)
+
+        def profiled():
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                run()
+            finally:
+                profile.disable()
+                self._collect(profile)
+        return profiled
+
+    def _shared(self, run):
+        # A single profile enabled while any attached thread runs
+        def profiled():
+            with self.lock:
+                if not self.running:
+                    self.profile = cProfile.Profile()
+                    self.profile.enable()
+                self.running += 1
+            try:
+                run()
+            finally:
+                with self.lock:
+                    self.running -= 1
+                    profile = None
+                    if not self.running:
+                        profile, self.profile = self.profile, None
+                        profile.disable()
+                if profile is not None:
+                    self._collect(profile)
+        return profiled
+
+    def _collect(self, profile):
+        with self.lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+
+    def _sample(self):
+        while not self.flag.wait(self.interval):
+            frames = sys._current_frames()
+            for thread in list(self.threads):
+                frame = frames.get(thread.ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_function(frame))
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[(thread.name, *reversed(stack))] += 1
+                    self.samples += 1
+
+    def stop(self):
+        """Stops sampling. Deterministic profiles are collected when
+        attached threads finish"""
+        self.flag.set()
+        if self.sampler is not None:
+            self.sampler.join()
+
+    def save(self, path):
+        """Writes profile: pstats file (deterministic) or collapsed stacks,
+        one line per stack with number of samples (sampling)
+        :param path: Profile file path
+        :type path: str"""
+        if self.mode == 'deterministic':
+            if self.stats is not None:
+                self.stats.dump_stats(path)
+            return
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+
+    def summary(self, top=20):
+        """Hot functions: most time spent in function itself
+        (deterministic) or most samples running it (sampling)
+        :param top: Number of functions
+        :type top: int, optional. Default: 20
+        :rtype: str"""
+        if self.mode == 'deterministic':
+            if self.stats is None:
+                return "No profile collected."
+            out = io.StringIO()
+            self.stats.stream = out
+            self.stats.sort_stats('tottime').print_stats(top)
+            return out.getvalue()
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack[1:]):
+                total[function] += count
+        if not self.samples:
+            return "No samples collected."
+        lines = [f"{self.samples} samples, every {self.interval * 1e3:g}ms",
+                 f"{'own %':>7} {'total %':>7}  function"]
+        for function, count in own.most_common(top):
+            lines.append(f"{100 * count / self.samples:7.1f} "
+                         f"{100 * total[function] / self.samples:7.1f}  "
+                         f"{function}")
+        return '\n'.join(lines)
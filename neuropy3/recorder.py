@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# recorder - Asynchronous recording module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from queue import Queue, Empty, Full
+from neuropy3 import utils as ut
+from threading import Thread
+
+import time
+import os
+
+
+def csv_line(record):
+    """CSV line of a record value, eeg values are comma separated"""
+    value = record[1]
+    if isinstance(value, tuple):
+        return f'{",".join(map(str, value))}\n'
+    return f'{value}\n'
+
+
+def record_value(record):
+    """Value of a record, e.g. for neuropy3.codec.RawWriter"""
+    return record[1]
+
+
+class Recorder(Thread):
+    """Thread class writing MindWave values to files. The reader only
+    enqueues values in a bounded queue, values are written in batches and
+    files are flushed when ``batch`` values are written or every
+    ``interval`` seconds (group commit), so disk I/O never blocks the
+    reader. Values are dropped if the queue is full.
+    Used as MindWave sink, see ``MindWave.add_sink``.
+    :param size: Maximum number of values queued
+    :type size: int, optional. Default: 8192 (16 seconds of raw values)
+    :param batch: Values written between flushes
+    :type batch: int, optional. Default: 1024
+    :param interval: Maximum seconds between flushes
+    :type interval: float, optional. Default: 1
+    :param verbose: Verbose level
+    :type verbose: int, optional. Allowed values: 0-4. Default: 1
+    """
+    def __init__(self, size=8192, batch=1024, interval=1., verbose=1):
+        Thread.__init__(self, daemon=True)
+        self.queue = Queue(size)
+        self.batch = batch
+        self.interval = interval
+        self.verbose = verbose
+        self.files = {}
+        self.targets = []
+        self.dropped = 0
+        self.written = 0
+        self.running = True
+
+    def add(self, name, target, fmt=csv_line):
+        """Records a MindWave value in a file
+        :param name: Value name, see ``MindWave.data``
+        :type name: str
+        :param target: Opened file, or object with write and close
+                       (e.g. neuropy3.codec.RawWriter)
+        :type target: file object
+        :param fmt: Function formatting records (name, value, timestamp)
+                    before writing, None writes records as received
+        :type fmt: function, optional. Default: csv_line"""
+        self.files.setdefault(name, []).append((target, fmt))
+        if target not in self.targets:
+            self.targets.append(target)
+
+    def add_session(self, session, names=None):
+        """Records several MindWave values in a single session file
+        :param session: Session writer
+        :type session: neuropy3.session.SessionWriter
+        :param names: Value names
+        :type names: list of str, optional. Default: every stream"""
+        from neuropy3.session import STREAMS
+        for name in names or STREAMS:
+            self.add(name, session, None)
+
+    def update(self, name, value, timestamp):
+        """Sink interface, see ``MindWave.add_sink``"""
+        if name in self.files:
+            if isinstance(value, dict):
+                # eeg dict is updated in place by reader
+                value = tuple(value.values())
+            try:
+                self.queue.put_nowait((name, value, timestamp))
+            except Full:
+                self.dropped += 1
+
+    def run(self):
+        """Writes queued values until recorder is stopped"""
+        pending = 0
+        last = time.monotonic()
+        while self.running or not self.queue.empty():
+            try:
+                record = self.queue.get(timeout=self.interval)
+            except Empty:
+                pass
+            else:
+                pending += self._write(record)
+            now = time.monotonic()
+            if pending and (pending >= self.batch
+                            or now - last >= self.interval):
+                self._flush()
+                pending = 0
+                last = now
+        self._flush()
+
+    def _write(self, record):
+        # Drain queued values without waiting
+        written = 0
+        while True:
+            for target, fmt in self.files[record[0]]:
+                target.write(record if fmt is None else fmt(record))
+            written += 1
+            if written >= self.batch:
+                break
+            try:
+                record = self.queue.get_nowait()
+            except Empty:
+                break
+        self.written += written
+        return written
+
+    def _flush(self):
+        for target in self.targets:
+            if hasattr(target, 'flush'):
+                target.flush()
+
+    def stop(self):
+        """Writes queued values, closes files and writes them to disk"""
+        self.running = False
+        if self.is_alive():
+            self.join()
+        for target in self.targets:
+            target.close()
+            path = getattr(target, 'path', getattr(target, 'name', None))
+            # Regular files only, e.g. not os.devnull
+            if (isinstance(path, (str, os.PathLike))
+                    and os.path.isfile(path)):
+                ut.fsync(path)
+        if self.dropped:
+            ut.log('warn', f"Recorder queue full, {self.dropped} values "
+                   f"dropped.", self.verbose)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# registry - Known headsets registry module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from neuropy3 import utils as ut
+from pathlib import Path
+
+import numbers
+import json
+import time
+import os
+
+
+DEVICE_NAME = 'MindWave Mobile'
+
+
+def default_path():
+    """Registry file path: $XDG_CACHE_HOME/neuropy3/devices.json"""
+    cache = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(cache) / 'neuropy3' / 'devices.json'
+
+
+class Registry:
+    """Persistent cache of known MindWave Mobile addresses, so connection
+    does not require a bluetooth scan.
+    :param path: Registry file path
+    :type path: str, optional. Default: $XDG_CACHE_HOME/neuropy3/devices.json
+    :param verbose: Verbosity level
+    :type verbose: int, optional. Default: 1
+    """
+    def __init__(self, path=None, verbose=1):
+        self.path = Path(path) if path is not None else default_path()
+        self.verbose = verbose
+        self.devices = {}
+        self.load()
+
+    def load(self):
+        """Loads known devices from registry file, malformed entries (or
+        file) are ignored"""
+        try:
+            with open(self.path) as f:
+                devices = json.load(f)
+        except (OSError, ValueError):
+            devices = None
+        if not isinstance(devices, dict):
+            devices = {}
+        self.devices = {
+            address: device for address, device in devices.items()
+            if isinstance(device, dict)
+            and isinstance(device.get('name'), str)
+            and isinstance(device.get('last_seen'), numbers.Real)}
+
+    def save(self):
+        """Stores known devices in registry file. A registry that cannot
+        be written (e.g. read-only cache) is only reported
+        :return: Whether registry was stored
+        :rtype: bool"""
+        tmp = self.path.with_suffix('.tmp')
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, 'w') as f:
+                json.dump(self.devices, f, indent=2)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            ut.log('warn', f"Could not save known headsets registry: "
+                   f"{e.strerror or e}", self.verbose)
+            return False
+        return True
+
+    def register(self, address, name=None, last_seen=None):
+        """Adds or refreshes a device
+        :param address: Bluetooth address
+        :type address: str
+        :param name: Bluetooth name
+        :type name: str, optional. Default: known name, or MindWave Mobile
+        :param last_seen: Epoch time the device was seen
+        :type last_seen: float, optional. Default: now"""
+        if name is None:
+            name = self.devices.get(address, {}).get('name', DEVICE_NAME)
+        self.devices[address] = {
+            'name': name,
+            'last_seen': last_seen if last_seen is not None else time.time()
+        }
+
+    def forget(self, address):
+        """Removes a device"""
+        self.devices.pop(address, None)
+
+    def known(self):
+        """Known devices, most recently seen first
+        :return: Addresses and device info (name, last_seen)
+        :rtype: list of tuple(str, dict)"""
+        return sorted(self.devices.items(),
+                      key=lambda dev: dev[1]['last_seen'], reverse=True)
+
+    def latest(self):
+        """Address of the most recently seen device
+        :rtype: str or None"""
+        known = self.known()
+        return known[0][0] if known else None
+
+    def scan(self, duration=8):
+        """Runs a single bluetooth inquiry registering every MindWave
+        Mobile in range, useful with several headsets
+        :param duration: Inquiry duration, in units of 1.28 seconds
+        :type duration: int, optional. Default: 8
+        :return: Addresses and names of headsets found
+        :rtype: list of tuple(str, str)
+        :raises OSError: If bluetooth is not available (registry that
+                         cannot be written is only reported)"""
+        import bluetooth
+        found = [(address, name) for address, name in
+                 bluetooth.discover_devices(duration=duration,
+                                            lookup_names=True)
+                 if name is not None and name.startswith(DEVICE_NAME)]
+        now = time.time()
+        for address, name in found:
+            self.register(address, name, now)
+        self.save()
+        return found
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# server - Local streaming server module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from threading import Condition, Thread
+from neuropy3 import utils as ut
+from collections import deque
+from array import array
+
+import socket
+import struct
+import sys
+import os
+
+
+# Binary protocol, every message is framed as:
+# <length: uint32><type: uint8><payload: length bytes>
+# payloads (little endian):
+# HELLO: version (uint16), sample rate (uint16)
+# RAW: timestamp of last sample (float64), samples (int16 * n)
+# ESENSE: timestamp (float64), name index in ESENSE (uint8), value (uint8)
+# EEG: timestamp (float64), power bands in ut.NAMES[6:] order (uint32 * 8)
+# VECTOR: timestamp (float64), values (float32 * n), see neuropy3.pipeline
+FRAME = struct.Struct('<IB')
+HELLO = struct.Struct('<HH')
+TIMESTAMP = struct.Struct('<d')
+ESENSE_VALUE = struct.Struct('<dBB')
+EEG_VALUE = struct.Struct('<d8I')
+MSG = {
+    'hello': 0,
+    'raw': 1,
+    'esense': 2,
+    'eeg': 3,
+    'vector': 4
+}
+ESENSE = ut.NAMES[1:4]
+VERSION = 1
+ADDRESS = 'tcp:127.0.0.1:7357'
+
+
+def parse_address(address):
+    """Parses server address
+    :param address: Address in the form tcp:HOST:PORT or unix:PATH
+    :type address: str
+    :return: Socket family and socket address
+    :rtype: tuple"""
+    kind, _, location = address.partition(':')
+    if kind == 'unix':
+        return socket.AF_UNIX, location
+    elif kind == 'tcp':
+        host, _, port = location.rpartition(':')
+        return socket.AF_INET, (host, int(port))
+    raise ValueError(f"Address must be tcp:HOST:PORT or unix:PATH, "
+                     f"not {address}")
+
+
+def frame(mtype, payload):
+    """Builds a protocol message
+    :param mtype: Message type
+    :type mtype: int
+    :param payload: Message payload
+    :type payload: bytes
+    :return: Framed message
+    :rtype: bytes"""
+    return FRAME.pack(len(payload), mtype) + payload
+
+
+class ClientWriter(Thread):
+    """Thread class sending framed messages to one connected client.
+    Messages are stored in a bounded buffer; when client is slower than
+    the headset, oldest messages are dropped so reader never blocks.
+    :param conn: Client socket
+    :type conn: socket.socket
+    :param server: Server owning the client
+    :type server: StreamServer
+    :param buffer: Maximum number of messages buffered
+    :type buffer: int
+    """
+    def __init__(self, conn, server, buffer):
+        Thread.__init__(self, daemon=True)
+        self.conn = conn
+        self.server = server
+        self.queue = deque(maxlen=buffer)
+        self.cond = Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, message):
+        """Buffers a message to be sent
+        :param message: Framed message
+        :type message: bytes"""
+        with self.cond:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(message)
+            self.cond.notify()
+
+    def run(self):
+        """Sends buffered messages until client disconnects"""
+        try:
+            while True:
+                with self.cond:
+                    while not self.queue and not self.closed:
+                        self.cond.wait()
+                    if not self.queue:
+                        # Closed, every buffered message sent
+                        break
+                    # Group every buffered message in one send
+                    data = b''.join(self.queue)
+                    self.queue.clear()
+                self.conn.sendall(data)
+        except OSError:
+            pass
+        self.close()
+        self.server.remove(self)
+
+    def finish(self, timeout=1):
+        """Sends buffered messages and closes client connection
+        :param timeout: Maximum seconds waiting for a slow client
+        :type timeout: float, optional. Default: 1"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        if self.is_alive():
+            self.join(timeout)
+        self.close()
+
+    def close(self):
+        """Closes client connection"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+
+
+class StreamServer(Thread):
+    """Thread class accepting clients and streaming MindWave data.
+    Used as MindWave sink, see ``MindWave.add_sink``.
+    :param address: Address in the form tcp:HOST:PORT or unix:PATH
+    :type address: str, optional. Default: tcp:127.0.0.1:7357
+    :param block: Number of raw samples sent per message
+    :type block: int, optional. Default: 32
+    :param buffer: Maximum number of messages buffered per client
+    :type buffer: int, optional. Default: 512
+    :param verbose: Verbose level
+    :type verbose: int, optional. Allowed values: 0-4. Default: 1
+    """
+    def __init__(self, address=ADDRESS, block=32, buffer=512, verbose=1):
+        Thread.__init__(self, daemon=True)
+        self.address = address
+        self.block = block
+        self.buffer = buffer
+        self.verbose = verbose
+        self.clients = []
+        self.raw = array('h')
+        self.last = 0.
+        self.family, self.location = parse_address(address)
+        self.socket = socket.socket(self.family, socket.SOCK_STREAM)
+        if self.family == socket.AF_UNIX:
+            if os.path.exists(self.location):
+                os.unlink(self.location)
+        else:
+            self.socket.setsockopt(socket.SOL_SOCKET,
+                                   socket.SO_REUSEADDR, 1)
+        self.socket.bind(self.location)
+        self.socket.listen()
+        self.running = True
+
+    def run(self):
+        """Accepts clients until server is stopped"""
+        ut.log('info', f"Streaming server listening on {self.address}.",
+               self.verbose)
+        while self.running:
+            try:
+                conn, _ = self.socket.accept()
+            except OSError:
+                break
+            if self.family == socket.AF_INET:
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = ClientWriter(conn, self, self.buffer)
+            client.put(frame(MSG['hello'],
+                             HELLO.pack(VERSION, ut.SAMPLE_RATE)))
+            self.clients.append(client)
+            client.start()
+            ut.log('info', f"Streaming client connected "
+                   f"({len(self.clients)} total).", self.verbose)
+
+    def remove(self, client):
+        """Removes a disconnected client
+        :param client: Client to be removed
+        :type client: ClientWriter"""
+        if client in self.clients:
+            self.clients.remove(client)
+            if client.dropped:
+                ut.log('warn', f"Streaming client too slow, "
+                       f"{client.dropped} messages dropped.", self.verbose)
+            ut.log('info', "Streaming client disconnected.", self.verbose)
+
+    def broadcast(self, message):
+        """Buffers a message in every client
+        :param message: Framed message
+        :type message: bytes"""
+        for client in list(self.clients):
+            client.put(message)
+
+    def update(self, name, value, timestamp):
+        """Sink interface, see ``MindWave.add_sink``"""
+        if name == 'raw':
+            self.raw.append(value)
+            self.last = timestamp
+            if len(self.raw) >= self.block:
+                self.flush()
+        elif name in ESENSE:
+            self.broadcast(frame(
+                MSG['esense'],
+                ESENSE_VALUE.pack(timestamp, ESENSE.index(name), value)))
+        elif name == 'eeg':
+            self.broadcast(frame(
+                MSG['eeg'],
+                EEG_VALUE.pack(timestamp,
+                               *(value[band] for band in ut.NAMES[6:]))))
+
+    def flush(self):
+        """Buffers pending raw samples in every client, as a message
+        timestamped with the latest sample"""
+        if self.raw:
+            if sys.byteorder != 'little':
+                # array uses host byte order, protocol is little endian
+                self.raw.byteswap()
+            self.broadcast(frame(
+                MSG['raw'], TIMESTAMP.pack(self.last) + self.raw.tobytes()))
+            del self.raw[:]
+
+    def stop(self):
+        """Stops accepting clients and disconnects every client, after
+        sending pending raw samples and buffered messages"""
+        self.flush()
+        self.running = False
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+        for client in list(self.clients):
+            client.finish()
+        if self.family == socket.AF_UNIX and os.path.exists(self.location):
+            os.unlink(self.location)
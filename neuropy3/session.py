@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# session - Multiplexed session recording module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from neuropy3 import utils as ut
+from array import array
+
+import struct
+import sys
+
+
+# Session file: header followed by records (little endian)
+# HEADER: magic, version, raw sample rate (uint16)
+# RECORD: timestamp (float64, time.monotonic), stream id (uint8),
+#         payload length (uint16), payload: values of stream type
+# raw records hold consecutive samples, timestamp of first sample
+MAGIC = b'NP3S'
+VERSION = 1
+EXTENSION = '.np3'
+HEADER = struct.Struct('<4sBH')
+RECORD = struct.Struct('<dBH')
+STREAMS = {
+    'raw': 'h',
+    'signal': 'B',
+    'attention': 'B',
+    'meditation': 'B',
+    'blink': 'B',
+    'eeg': 'I',
+    'gap': 'd'
+}
+STREAM_ID = {name: idx for idx, name in enumerate(STREAMS)}
+STREAM_NAME = list(STREAMS)
+
+
+class SessionWriter:
+    """Writes every MindWave stream to a single file, one record per value
+    (raw samples grouped in blocks) with timestamp and stream id.
+    Records are written in time order to a single buffered file, use it
+    with neuropy3.recorder.Recorder (see ``Recorder.add_session``) to
+    write from a background thread, or as MindWave sink.
+    :param path: Session file path
+    :type path: str
+    :param block: Raw samples per record
+    :type block: int, optional. Default: 128
+    """
+    def __init__(self, path, block=128):
+        self.path = path
+        self.block = block
+        self.raw = array('h')
+        self.raw_timestamp = 0.
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, ut.SAMPLE_RATE))
+
+    def _record(self, name, values, timestamp):
+        payload = array(STREAMS[name], values)
+        if sys.byteorder != 'little':
+            # array uses host byte order, records are little endian
+            payload.byteswap()
+        payload = payload.tobytes()
+        self.file.write(RECORD.pack(timestamp, STREAM_ID[name],
+                                    len(payload)))
+        self.file.write(payload)
+
+    def _write_raw(self):
+        if self.raw:
+            self._record('raw', self.raw, self.raw_timestamp)
+            self.raw = array('h')
+
+    def write(self, record):
+        """Writes a value
+        :param record: Value name, value and timestamp
+        :type record: tuple(str, int or tuple or float, float)"""
+        name, value, timestamp = record
+        if name == 'raw':
+            if not self.raw:
+                self.raw_timestamp = timestamp
+            self.raw.append(value)
+            if len(self.raw) >= self.block:
+                self._write_raw()
+        elif name in STREAMS:
+            # Pending raw samples come first, keeps records in time order
+            self._write_raw()
+            if isinstance(value, dict):
+                value = value.values()
+            elif not isinstance(value, tuple):
+                value = (value,)
+            self._record(name, value, timestamp)
+
+    def update(self, name, value, timestamp):
+        """Sink interface, see ``MindWave.add_sink``"""
+        self.write((name, value, timestamp))
+
+    def flush(self):
+        """Flushes written records to disk"""
+        self.file.flush()
+
+    def close(self):
+        """Writes pending raw samples and closes session"""
+        if not self.file.closed:
+            self._write_raw()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SessionReader:
+    """Reads a session file written by SessionWriter
+    :param path: Session file path
+    :type path: str
+    :raises ValueError: If file is not a session file
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        if len(self.data) < HEADER.size:
+            raise ValueError(f"{path} is not a session file")
+        magic, version, self.rate = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a session file")
+
+    def records(self):
+        """Records in file order, a truncated last record is ignored
+        :return: Timestamp, stream name and values of every record
+        :rtype: generator of tuple(float, str, array.array)"""
+        offset = HEADER.size
+        while offset + RECORD.size <= len(self.data):
+            timestamp, stream, length = RECORD.unpack_from(self.data, offset)
+            offset += RECORD.size
+            if offset + length > len(self.data):
+                break
+            name = STREAM_NAME[stream]
+            values = array(STREAMS[name], self.data[offset:offset + length])
+            if sys.byteorder != 'little':
+                values.byteswap()
+            offset += length
+            yield timestamp, name, values
+
+    def streams(self):
+        """Demultiplexed streams, raw sample timestamps are interpolated
+        from the first sample of every record at the sample rate
+        :return: Timestamps and values of every stream. eeg values have
+                 one column per band (see utils.NAMES)
+        :rtype: dict of tuple(numpy.ndarray, numpy.ndarray)"""
+        import numpy as np
+        raw_times, raw = [], []
+        times = {name: [] for name in STREAMS if name != 'raw'}
+        values = {name: [] for name in times}
+        for timestamp, name, record in self.records():
+            if name == 'raw':
+                raw_times.append(timestamp
+                                 + np.arange(len(record)) / self.rate)
+                raw.append(np.frombuffer(record, dtype=np.int16))
+            else:
+                times[name].append(timestamp)
+                values[name].append(record if name == 'eeg' else record[0])
+        streams = {'raw': (np.concatenate(raw_times) if raw else np.empty(0),
+                           np.concatenate(raw) if raw
+                           else np.empty(0, dtype=np.int16))}
+        for name in times:
+            streams[name] = (np.array(times[name]),
+                             np.array(values[name], dtype=STREAMS[name]))
+        streams['eeg'] = (streams['eeg'][0],
+                          streams['eeg'][1].reshape(-1, len(ut.NAMES[6:])))
+        return streams
+
+    def raw(self):
+        """Raw values of the session
+        :rtype: numpy.ndarray of int16"""
+        import numpy as np
+        raw = array('h')
+        for _, name, record in self.records():
+            if name == 'raw':
+                raw.extend(record)
+        return np.array(raw, dtype=np.int16)
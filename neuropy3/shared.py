@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# shared - Shared memory publisher module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from multiprocessing import parent_process, resource_tracker, shared_memory
+from neuropy3 import utils as ut
+
+import struct
+import time
+import sys
+import os
+
+
+# Memory layout:
+# header: sequence counter, raw samples written, ring size, last timestamp
+# esense: signal, attention, meditation
+# pid: publisher process id
+# eeg: asic eeg power bands
+# ring: raw samples (int16) ring buffer
+_HEADER = struct.Struct('<QQQd')
+_ESENSE = struct.Struct('<3I')
+_PID = struct.Struct('<I')
+_EEG = struct.Struct('<8I')
+_ESENSE_OFF = _HEADER.size
+_PID_OFF = _ESENSE_OFF + _ESENSE.size
+_EEG_OFF = _PID_OFF + _PID.size
+_RING_OFF = _EEG_OFF + _EEG.size
+ESENSE = ut.NAMES[1:4]
+BANDS = ut.NAMES[6:]
+NAME = 'neuropy3'
+RING_SIZE = 4096
+
+
+class SharedPublisher:
+    """Publishes MindWave data in a shared memory block, so other
+    processes can attach with SharedReader and read it without pickling
+    or sockets.
+    Every write is guarded by a sequence counter: odd while writing,
+    even when data is consistent.
+    :param name: Shared memory block name
+    :type name: str, optional. Default: neuropy3
+    :param size: Number of raw samples in ring buffer
+    :type size: int, optional. Default: 4096
+    :param replace: Remove an existing block with the same name, e.g. left
+                    by a crashed publisher, instead of failing
+    :type replace: bool, optional. Default: False
+    :raises FileExistsError: If block exists and replace is not set
+    """
+    def __init__(self, name=NAME, size=RING_SIZE, replace=False):
+        self.size = size
+        try:
+            self.shm = shared_memory.SharedMemory(
+                name=name, create=True, size=_RING_OFF + 2 * size)
+        except FileExistsError:
+            if not replace:
+                raise FileExistsError(
+                    f"Shared memory block {name} already exists (another "
+                    f"publisher running?). Use replace=True to remove a "
+                    f"stale block.") from None
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(
+                name=name, create=True, size=_RING_OFF + 2 * size)
+        self.name = self.shm.name
+        self.ring = self.shm.buf[_RING_OFF:_RING_OFF + 2 * size].cast('h')
+        self.seq = 0
+        self.samples = 0
+        self.esense = [0] * len(ESENSE)
+        _HEADER.pack_into(self.shm.buf, 0, 0, 0, size, 0.0)
+        _PID.pack_into(self.shm.buf, _PID_OFF, os.getpid())
+
+    def _begin(self):
+        self.seq += 1
+        struct.pack_into('<Q', self.shm.buf, 0, self.seq)
+
+    def _end(self, timestamp):
+        self.seq += 1
+        _HEADER.pack_into(self.shm.buf, 0, self.seq, self.samples,
+                          self.size, timestamp)
+
+    def update(self, name, value, timestamp=None):
+        """Writes a new value in shared memory
+        :param name: Name of variable updated
+        :type name: str
+        :param value: New value
+        :type value: int or dict (eeg)
+        :param timestamp: Reader timestamp of value (time.monotonic)
+        :type timestamp: float, optional. Default: now"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if name == 'raw':
+            self._begin()
+            self.ring[self.samples % self.size] = value
+            self.samples += 1
+            self._end(timestamp)
+        elif name in ESENSE:
+            self._begin()
+            self.esense[ESENSE.index(name)] = value
+            _ESENSE.pack_into(self.shm.buf, _ESENSE_OFF, *self.esense)
+            self._end(timestamp)
+        elif name == 'eeg':
+            self._begin()
+            _EEG.pack_into(self.shm.buf, _EEG_OFF,
+                           *(value[band] for band in BANDS))
+            self._end(timestamp)
+
+    def close(self):
+        """Releases and removes the shared memory block"""
+        if self.shm is not None:
+            self.ring.release()
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class SharedReader:
+    """Attaches to a shared memory block created by SharedPublisher.
+    Any number of readers can be attached at the same time.
+    :param name: Shared memory block name
+    :type name: str, optional. Default: neuropy3
+    """
+    def __init__(self, name=NAME):
+        # Readers must not remove the block on exit, only the publisher
+        if sys.version_info >= (3, 13):
+            self.shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            if not self._publisher_tracker():
+                resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.size = _HEADER.unpack_from(self.shm.buf, 0)[2]
+        self.ring = self.shm.buf[
+            _RING_OFF:_RING_OFF + 2 * self.size].cast('h')
+
+    def _publisher_tracker(self):
+        """Whether reader shares the resource tracker of the publisher
+        (same process or its multiprocessing child), which tracks the
+        block once, so it must not be unregistered"""
+        pid = _PID.unpack_from(self.shm.buf, _PID_OFF)[0]
+        parent = parent_process()
+        return pid == os.getpid() or (parent is not None
+                                      and parent.pid == pid)
+
+    def _consistent(self, read):
+        """Executes read until it is not overlapped by a write, yielding
+        the processor between retries so the publisher can finish"""
+        while True:
+            seq = struct.unpack_from('<Q', self.shm.buf, 0)[0]
+            if not seq & 1:
+                result = read()
+                if struct.unpack_from('<Q', self.shm.buf, 0)[0] == seq:
+                    return seq, result
+            time.sleep(0)
+
+    def snapshot(self):
+        """Latest values published
+        :return: Sequence, samples written, timestamp, esense and eeg values
+        :rtype: dict"""
+        def read():
+            header = _HEADER.unpack_from(self.shm.buf, 0)
+            esense = _ESENSE.unpack_from(self.shm.buf, _ESENSE_OFF)
+            eeg = _EEG.unpack_from(self.shm.buf, _EEG_OFF)
+            return header, esense, eeg
+
+        seq, (header, esense, eeg) = self._consistent(read)
+        data = {'seq': seq, 'samples': header[1], 'timestamp': header[3],
+                'eeg': dict(zip(BANDS, eeg))}
+        data.update(zip(ESENSE, esense))
+        return data
+
+    def raw(self, since=0):
+        """Raw samples published after a given sample counter
+        :param since: Samples counter of the last read
+        :type since: int, optional. Default: 0
+        :return: Current samples counter and new samples (oldest first).
+                 If reader fell behind more than ring size, only the last
+                 ring size samples are returned
+        :rtype: tuple(int, list)"""
+        def read():
+            samples = _HEADER.unpack_from(self.shm.buf, 0)[1]
+            start = max(since, samples - self.size)
+            first = start % self.size
+            last = first + max(0, samples - start)
+            # Copy of new samples only (up to two slices if ring wraps),
+            # decoded outside the consistency check
+            if last <= self.size:
+                return samples, self.ring[first:last].tobytes()
+            return samples, (self.ring[first:].tobytes()
+                             + self.ring[:last - self.size].tobytes())
+
+        samples, new = self._consistent(read)[1]
+        return samples, memoryview(new).cast('h').tolist()
+
+    def close(self):
+        """Detaches from the shared memory block"""
+        if self.shm is not None:
+            self.ring.release()
+            self.shm.close()
+            self.shm = None
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# synthetic - Synthetic ThinkGear streams module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from neuropy3.transport import Transport
+
+import neuropy3.utils as ut
+import struct
+import time
+
+
+def packet(payload):
+    """ThinkGear packet of a payload"""
+    return (ut.BYTE['sync'] * 2 + bytes([len(payload)]) + payload
+            + bytes([~sum(payload) & 0xFF]))
+
+
+def synthetic_stream(seconds=8, seed=0):
+    """ThinkGear byte stream of a headset: raw values (see
+    ``utils.synthetic_raw``), plus signal, eeg, attention and meditation
+    every second
+    :param seconds: Seconds of data
+    :type seconds: int, optional. Default: 8
+    :rtype: bytes"""
+    raw = ut.synthetic_raw(seconds * ut.SAMPLE_RATE, seed)
+    stream = bytearray()
+    for second in range(seconds):
+        for value in raw[second * ut.SAMPLE_RATE:
+                         (second + 1) * ut.SAMPLE_RATE]:
+            stream += packet(ut.BYTE['raw'] + b'\x02'
+                             + struct.pack('>h', value))
+        eeg = b''.join(struct.pack('>I', (second + 1) * (band + 1) * 1000)
+                       [1:] for band in range(8))
+        stream += packet(ut.BYTE['signal'] + b'\x00'
+                         + ut.BYTE['eeg'] + bytes([ut.PKT_EEG_MAX]) + eeg
+                         + ut.BYTE['attention'] + bytes([40 + second])
+                         + ut.BYTE['meditation'] + bytes([60 - second]))
+    return bytes(stream)
+
+
+class SyntheticTransport(Transport):
+    """Endless replay of a synthetic stream (see ``synthetic_stream``)
+    :param speed: Times faster than a headset, None as fast as possible
+    :type speed: float, optional
+    :param seconds: Seconds of data replayed in a loop
+    :type seconds: int, optional. Default: 8
+    """
+    name = 'synthetic'
+
+    def __init__(self, speed=None, seconds=8):
+        self.data = synthetic_stream(seconds)
+        self.rate = (len(self.data) / seconds * speed
+                     if speed is not None else None)
+        self.offset = 0
+        self.sent = 0
+        self.started = None
+
+    def open(self):
+        self.started = time.monotonic()
+
+    def close(self):
+        pass
+
+    def recv_into(self, buffer):
+        size = len(buffer)
+        if self.rate is not None:
+            allowed = int((time.monotonic() - self.started) * self.rate)
+            if allowed <= self.sent:
+                time.sleep(0.001)
+                allowed = int((time.monotonic() - self.started)
+                              * self.rate)
+            size = max(1, min(size, allowed - self.sent))
+        size = min(size, len(self.data) - self.offset)
+        buffer[:size] = self.data[self.offset:self.offset + size]
+        self.offset = (self.offset + size) % len(self.data)
+        self.sent += size
+        return size
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# trace - Latency tracing module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from neuropy3 import utils as ut
+from collections import deque
+
+import threading
+import json
+import os
+
+
+# Spans recorded (time.monotonic, seconds):
+# recv: waiting for bytes in transport
+# parse: bytes received until value decoded (per value)
+# sink:<class>, callback:<name>: sink or callback call
+# delivery: bytes received until every sink and callback returned
+# pipeline:<stage>: stage processing, pipeline:<stage>:e2e: value
+#                   published until stage processed it
+# gui:dsp, gui:render: GUI computation and chart update,
+# gui:e2e: last sample of a block published until block rendered
+
+
+class Tracer:
+    """Records timed spans of the stages a value goes through, from bytes
+    received to subscribers. Keeps the latest ``capacity`` spans, used to
+    compute latency percentiles per stage and exported as Chrome trace
+    (chrome://tracing or https://ui.perfetto.dev).
+    See ``MindWave`` tracer parameter.
+    :param capacity: Maximum number of spans kept
+    :type capacity: int, optional. Default: 262144
+    :param every: Raw values traced, one every ``every`` (other values
+                  are always traced)
+    :type every: int, optional. Default: 4
+    """
+    def __init__(self, capacity=1 << 18, every=4):
+        self.spans = deque(maxlen=capacity)
+        self.every = every
+        self.raw = 0
+        self.threads = {}
+
+    def sampled(self, name):
+        """Checks if a value is traced
+        :param name: Value name, see ``MindWave.data``
+        :type name: str
+        :rtype: bool"""
+        if name != 'raw':
+            return True
+        self.raw += 1
+        return self.raw % self.every == 0
+
+    def span(self, name, start, end, value=None):
+        """Records a span
+        :param name: Stage name
+        :type name: str
+        :param start: Start time (time.monotonic)
+        :type start: float
+        :param end: End time (time.monotonic)
+        :type end: float
+        :param value: Name of the value traced
+        :type value: str, optional"""
+        tid = threading.get_ident()
+        if tid not in self.threads:
+            self.threads[tid] = threading.current_thread().name
+        self.spans.append((name, start, end, tid, value))
+
+    def stats(self):
+        """Latency percentiles per stage (milliseconds)
+        :return: Stage name, number of spans and p50, p95, p99 and max
+        :rtype: dict of dict"""
+        durations = {}
+        for name, start, end, _, _ in list(self.spans):
+            durations.setdefault(name, []).append(end - start)
+        return {name: {'count': len(values),
+                       **{k: v * 1e3
+                          for k, v in ut.percentiles(values).items()}}
+                for name, values in sorted(durations.items())}
+
+    def report(self, verbose=2):
+        """Logs latency percentiles per stage"""
+        for name, stats in self.stats().items():
+            ut.log('info', f"{name}: {stats['count']} spans, "
+                   f"p50 {stats['p50']:.3f}ms p95 {stats['p95']:.3f}ms "
+                   f"p99 {stats['p99']:.3f}ms max {stats['max']:.3f}ms.",
+                   verbose)
+
+    def export(self, path):
+        """Writes spans as Chrome trace event JSON
+        :param path: Trace file path
+        :type path: str"""
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid,
+                   'tid': tid, 'args': {'name': name}}
+                  for tid, name in self.threads.items()]
+        for name, start, end, tid, value in list(self.spans):
+            event = {'name': name, 'cat': name.partition(':')[0],
+                     'ph': 'X', 'ts': start * 1e6,
+                     'dur': (end - start) * 1e6, 'pid': pid, 'tid': tid}
+            if value is not None:
+                event['args'] = {'value': value}
+            events.append(event)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
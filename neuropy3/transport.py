@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# transport - Byte stream transports module.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import select
+import socket
+import os
+
+
+class Transport:
+    """Byte stream carrying ThinkGear packets. Subclasses implement open,
+    close and recv_into; errors raise OSError, timeouts TimeoutError (or
+    socket.timeout), closed streams read 0 bytes. The end of a replayed
+    stream (replay) is not a lost connection.
+    """
+    name = 'transport'
+    timeout = None
+    replay = False
+
+    def open(self):
+        """Opens the byte stream"""
+        raise NotImplementedError
+
+    def close(self):
+        """Closes the byte stream"""
+        raise NotImplementedError
+
+    def settimeout(self, timeout):
+        """Maximum seconds to wait for data, None blocks forever"""
+        self.timeout = timeout
+
+    def recv_into(self, buffer):
+        """Reads available bytes (at most len(buffer)) into buffer
+        :param buffer: Writable buffer
+        :type buffer: bytearray or memoryview
+        :return: Number of bytes read, 0 if stream is closed
+        :rtype: int
+        :raises OSError: On errors
+        :raises TimeoutError: If no data is received before timeout"""
+        raise NotImplementedError
+
+    def __str__(self):
+        return self.name
+
+
+class BluetoothTransport(Transport):
+    """RFCOMM bluetooth connection. Uses python sockets if built with
+    bluetooth support, pybluez otherwise
+    :param address: Bluetooth address
+    :type address: str
+    :param channel: RFCOMM channel
+    :type channel: int, optional. Default: 1
+    """
+    def __init__(self, address, channel=1):
+        self.address = address
+        self.channel = channel
+        self.name = address
+        self.socket = None
+
+    def open(self):
+        if hasattr(socket, 'AF_BLUETOOTH'):
+            self.socket = socket.socket(socket.AF_BLUETOOTH,
+                                        socket.SOCK_STREAM,
+                                        socket.BTPROTO_RFCOMM)
+        else:
+            import bluetooth
+            self.socket = bluetooth.BluetoothSocket()
+        try:
+            self.socket.connect((self.address, self.channel))
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+        self.socket.settimeout(timeout)
+
+    def recv_into(self, buffer):
+        if hasattr(self.socket, 'recv_into'):
+            return self.socket.recv_into(buffer)
+        try:
+            data = self.socket.recv(len(buffer))
+        except OSError as e:
+            # pybluez reports timeouts as BluetoothError
+            if 'timed out' in str(e):
+                raise TimeoutError(str(e))
+            raise
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class TCPTransport(Transport):
+    """TCP connection, e.g. ThinkGear Connector style bridges or relays
+    forwarding the headset byte stream
+    :param host: Host name or IP address
+    :type host: str
+    :param port: TCP port
+    :type port: int
+    """
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.name = f"tcp:{host}:{port}"
+        self.socket = None
+
+    def open(self):
+        self.socket = socket.create_connection((self.host, self.port))
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+        self.socket.settimeout(timeout)
+
+    def recv_into(self, buffer):
+        return self.socket.recv_into(buffer)
+
+
+class SerialTransport(Transport):
+    """Serial device, e.g. /dev/rfcomm0 bound with ``rfcomm bind``
+    :param path: Device path
+    :type path: str
+    """
+    def __init__(self, path):
+        self.path = path
+        self.name = path
+        self.fd = None
+
+    def open(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_NOCTTY)
+        if os.isatty(self.fd):
+            import tty
+            tty.setraw(self.fd)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def recv_into(self, buffer):
+        ready, _, _ = select.select([self.fd], [], [], self.timeout)
+        if not ready:
+            raise TimeoutError(f"{self.path} timed out")
+        return os.readv(self.fd, [buffer])
+
+
+class StreamTransport(Transport):
+    """In-memory, pipe or file byte stream, e.g. io.BytesIO or a replay of
+    a raw capture
+    :param stream: Binary file-like object with readinto
+    :type stream: io.RawIOBase or io.BufferedIOBase
+    """
+    replay = True
+
+    def __init__(self, stream, name='stream'):
+        self.stream = stream
+        self.name = name
+
+    def open(self):
+        pass
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+
+    def recv_into(self, buffer):
+        try:
+            return self.stream.readinto(buffer) or 0
+        except ValueError as e:
+            # I/O operation on closed stream
+            raise OSError(str(e)) from e
+
+
+class FileTransport(StreamTransport):
+    """Replays a byte stream capture file
+    :param path: Capture file path
+    :type path: str
+    """
+    def __init__(self, path):
+        StreamTransport.__init__(self, None, f"file:{path}")
+        self.path = path
+
+    def open(self):
+        self.stream = open(self.path, 'rb', buffering=0)
+
+
+def from_address(address):
+    """Builds a transport from an address:
+    tcp:HOST:PORT, serial:PATH (or /dev/... path), file:PATH or
+    bluetooth address
+    :param address: Transport address
+    :type address: str
+    :rtype: Transport"""
+    kind, _, location = address.partition(':')
+    if kind == 'tcp':
+        host, _, port = location.rpartition(':')
+        return TCPTransport(host, int(port))
+    elif kind == 'serial':
+        return SerialTransport(location)
+    elif kind == 'file':
+        return FileTransport(location)
+    elif address.startswith('/'):
+        return SerialTransport(address)
+    return BluetoothTransport(address)
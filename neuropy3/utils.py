@@ -22,10 +22,8 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-from scipy.fft import irfft, rfft, rfftfreq
-
-import numpy as np
-
+# numpy and scipy are imported when first used, reading headset data or
+# logging it from the command line does not require them
 
 _RED = '\033[91m'
 _YELLOW = '\033[93m'
@@ -47,11 +45,13 @@ BYTE = {
     'signal': b'\x02',
     'attention': b'\x04',
     'meditation': b'\x05',
+    'blink': b'\x16',
     'raw': b'\x80',
     'eeg': b'\x83',
     '_max': b'\x7f'
 }
 CODE = {v: k for k, v in BYTE.items()}
+CODE_INT = {v[0]: k for k, v in BYTE.items()}
 NAMES = ['battery', 'signal', 'attention', 'meditation', 'blink',
          'raw', 'delta', 'theta', 'alpha_l', 'alpha_h',
          'beta_l', 'beta_h', 'gamma_l', 'gamma_m']
@@ -70,6 +70,70 @@ EEG = {
 WINDOW = None
 
 
+class RingBuffer:
+    """Fixed size buffer keeping the latest values written. One thread
+    can append while others read new values with ``since``.
+    :param size: Maximum number of values stored
+    :type size: int
+    :param dtype: Type of values stored
+    :type dtype: numpy.dtype, optional. Default: float
+    """
+    def __init__(self, size, dtype=float):
+        import numpy as np
+        self.np = np
+        self.size = size
+        self.buffer = np.zeros(size, dtype=dtype)
+        self.count = 0
+
+    def append(self, value):
+        """Writes a value, overwriting the oldest one if buffer is full"""
+        self.buffer[self.count % self.size] = value
+        self.count += 1
+
+    def since(self, count):
+        """Values written after a given values counter
+        :param count: Values counter of the last read
+        :type count: int
+        :return: Current values counter and new values (oldest first),
+                 at most buffer size values
+        :rtype: tuple(int, numpy.ndarray)"""
+        current = self.count
+        start = max(count, current - self.size)
+        return current, self.buffer[
+            self.np.arange(start, current) % self.size]
+
+    def last(self, n_values):
+        """Latest n_values written (oldest first)"""
+        return self.since(self.count - n_values)[1]
+
+
+def fsync(path):
+    """Writes a file to disk, e.g. a recording closed before the system
+    stops the process
+    :param path: File path
+    :type path: str"""
+    import os
+
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def percentiles(values):
+    """p50, p95, p99 and max of values
+    :rtype: dict"""
+    if not values:
+        return dict.fromkeys(('p50', 'p95', 'p99', 'max'), 0.)
+    ordered = sorted(values)
+    last = len(ordered) - 1
+    return {'p50': ordered[int(last * 0.5)],
+            'p95': ordered[int(last * 0.95)],
+            'p99': ordered[int(last * 0.99)],
+            'max': ordered[-1]}
+
+
 def disable_ansi_colors():
     """Disable ANSI colors in log messages."""
     global _GREEN, _BLUE, _YELLOW, _RED, _CLEANC
@@ -121,7 +185,20 @@ def raw_to_microvolt(value):
     return round(((value * (1.8 / 4096)) / 2000) * 1e6, 3)
 
 
+def raw_to_microvolts(values):
+    """raw_to_microvolt of every raw value
+    :param values: Raw values
+    :type values: list or numpy.ndarray
+    :rtype: numpy.ndarray"""
+    import numpy as np
+
+    return np.round(((np.asarray(values) * (1.8 / 4096)) / 2000) * 1e6, 3)
+
+
 def microvolts_to_bands(microvolts):
+    from scipy.fft import irfft, rfft, rfftfreq
+    import numpy as np
+
     data_fft = rfft(microvolts)
     data_freq = rfftfreq(len(microvolts), d=1/SAMPLE_RATE)
     bands = []
@@ -137,5 +214,54 @@ def microvolts_to_bands(microvolts):
     return bands
 
 
+def synthetic_raw(n_samples, seed=0):
+    """Generates raw values resembling an EEG recording: alpha and theta
+    rhythms plus noise, used when no headset is available.
+    :param n_samples: Number of raw values
+    :type n_samples: int
+    :param seed: Random generator seed
+    :type seed: int, optional. Default: 0
+    :return: Raw values
+    :rtype: numpy.ndarray (int16)"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    time = np.arange(n_samples) / SAMPLE_RATE
+    signal = (60 * np.sin(2 * np.pi * 10 * time)
+              + 30 * np.sin(2 * np.pi * 6 * time)
+              + rng.normal(0, 20, n_samples))
+    return np.clip(signal, -2048, 2047).astype(np.int16)
+
+
 def signal_axes(signal):
     return min(signal), max(signal)
+
+
+def decimate_minmax(signal, width):
+    """Reduces signal to the minimum and maximum of each pixel column,
+    keeping its visual shape.
+    :param signal: Signal to be reduced
+    :type signal: list or numpy.ndarray
+    :param width: Number of pixel columns
+    :type width: int
+    :return: Indexes of selected samples and their values
+    :rtype: tuple(numpy.ndarray, numpy.ndarray)"""
+    import numpy as np
+
+    signal = np.asarray(signal)
+    if width < 1 or len(signal) <= 2 * width:
+        return np.arange(len(signal)), signal
+    # Columns covering every sample, sizes differ at most in one sample
+    bounds = np.linspace(0, len(signal), width + 1).astype(int)
+    size = np.diff(bounds).max()
+    columns = np.minimum(bounds[:-1, None] + np.arange(size),
+                         bounds[1:, None] - 1)
+    values = signal[columns]
+    rows = np.arange(width)
+    idx = np.sort(np.stack((columns[rows, values.argmin(axis=1)],
+                            columns[rows, values.argmax(axis=1)]), axis=1),
+                  axis=1).ravel()
+    if idx[-1] != len(signal) - 1:
+        # Chart reaches signal end
+        idx = np.append(idx, len(signal) - 1)
+    return idx, signal[idx]
@@ -61,7 +61,10 @@ setup(
         'scipy==1.9.1'
     ],
     extras_require={
-        'gui': ['PySide6==6.2.3', 'shiboken6==6.2.3']
+        'gui': ['PySide6==6.2.3', 'shiboken6==6.2.3'],
+        'lsl': ['pylsl'],
+        'parquet': ['pyarrow'],
+        'fast': ['numba']
     },
     entry_points={
         'console_scripts': [
@@ -0,0 +1,58 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# test_decoder - Vectorized decoder against MindWaveReader.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from neuropy3 import decoder
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture(params=['numpy', 'numba'])
+def kernel(request, monkeypatch):
+    """Frame scan kernel used by decoder, numba skipped if not installed"""
+    if request.param == 'numba':
+        pytest.importorskip('numba')
+    else:
+        monkeypatch.setattr(decoder, 'njit', None)
+    return request.param
+
+
+@pytest.mark.parametrize('name', list(decoder.corpus()))
+def test_decode_matches_reader(kernel, name):
+    data = decoder.corpus()[name]
+    expected = decoder.reference(data)
+    assert decoder._equal(decoder.decode(data), expected)
+    for chunk in (1000, 7):
+        decoded = decoder.decode_chunks(
+            data[start:start + chunk] for start in range(0, len(data), chunk))
+        assert decoder._equal(decoded, expected), f"chunk {chunk}"
+
+
+@pytest.mark.parametrize('name', list(decoder.corpus()))
+def test_scan_loop_matches_numpy(name):
+    # Byte loop compiled with numba, checked uncompiled
+    data = np.frombuffer(decoder.corpus()[name], dtype=np.uint8)
+    starts = np.empty(len(data) // 4 + 1, dtype=np.int64)
+    count, consumed = decoder._scan_loop(data, starts)
+    expected, expected_consumed = decoder._scan_numpy(data)
+    assert np.array_equal(starts[:count], expected)
+    assert consumed == expected_consumed
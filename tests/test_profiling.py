@@ -0,0 +1,65 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# test_profiling - Profiler of attached threads.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from neuropy3.profiling import Profiler
+from threading import Event, Thread
+
+
+def busy_first(started, release):
+    started.set()
+    release.wait(5)
+
+
+def busy_second(started, release):
+    started.set()
+    release.wait(5)
+
+
+def test_deterministic_profiles_every_thread():
+    profiler = Profiler('deterministic')
+    release = Event()
+    threads, started, errors = [], [], []
+    for target in (busy_first, busy_second):
+        flag = Event()
+        thread = Thread(target=target, args=(flag, release))
+        profiler.attach(thread)
+        run = thread.run
+
+        def checked(run=run):
+            try:
+                run()
+            except Exception as e:
+                errors.append(e)
+        thread.run = checked
+        threads.append(thread)
+        started.append(flag)
+    for thread in threads:
+        thread.start()
+    # Both threads run at the same time
+    assert all(flag.wait(5) for flag in started)
+    release.set()
+    for thread in threads:
+        thread.join()
+    profiler.stop()
+    assert not errors
+    functions = {function for _, _, function in profiler.stats.stats}
+    assert {'busy_first', 'busy_second'} <= functions
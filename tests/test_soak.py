@@ -0,0 +1,167 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# test_soak - Long-run memory soak test.
+
+# Copyright (C) 2022-2024 Sergio Chica Manjarrez @ pervasive.it.uc3m.es.
+# Universidad Carlos III de Madrid.
+
+# This file is part of neuropy3.
+
+# neuropy3 is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# neuropy3 is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Replays a synthetic headset stream through reader, recorder, pipeline,
+# tracer and, if PySide6 is installed, GUI backend (offscreen), checking
+# RSS and objects do not grow. Runs for NEUROPY3_SOAK seconds, skipped if
+# not set:
+# NEUROPY3_SOAK=28800 python -m pytest tests/test_soak.py
+# NEUROPY3_SOAK_SPEED: times faster than a headset (default: as fast as
+# possible), NEUROPY3_SOAK_INTERVAL: seconds between samples (default:
+# 10), NEUROPY3_SOAK_WARMUP: minimum seconds until buffers are full
+# (default: 60, longer until tracer spans are full)
+
+import os
+
+if not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY')):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from neuropy3.synthetic import SyntheticTransport
+from neuropy3.recorder import Recorder
+from neuropy3.pipeline import Pipeline, parse
+from neuropy3.neuropy3 import MindWave
+from neuropy3.trace import Tracer
+
+import resource
+import pytest
+import time
+import sys
+import gc
+
+
+DURATION = float(os.environ.get('NEUROPY3_SOAK', 0))
+SPEED = os.environ.get('NEUROPY3_SOAK_SPEED')
+INTERVAL = float(os.environ.get('NEUROPY3_SOAK_INTERVAL', 10))
+WARMUP = float(os.environ.get('NEUROPY3_SOAK_WARMUP', 60))
+PIPELINE = 'raw | microvolts | bands | power'
+MAX_RSS = 16 * 2**20  # bytes
+MAX_OBJECTS = 0.05  # fraction of first sample
+
+
+def rss():
+    """Resident set size of process in bytes (peak RSS if /proc is not
+    available)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def objects():
+    """Objects tracked by garbage collector, after a collection"""
+    gc.collect()
+    return len(gc.get_objects())
+
+
+class GUI:
+    """Offscreen GUI backend fed as BackendThread does: scrolling raw
+    ring, DSPWorker queue, raw and eeg chart updates"""
+    def __init__(self):
+        from PySide6.QtWidgets import QApplication
+        from neuropy3.gui.gui import Backend, BackendThread, DSPWorker
+        from neuropy3.gui.bench import build_charts
+
+        self.app = QApplication.instance() or QApplication(sys.argv)
+        self.backend = Backend(scrolling=True)
+        self.views = build_charts(self.backend)
+        self.thread = BackendThread(None, self.backend, None, None,
+                                    verbose=0)
+        self.thread.worker = DSPWorker(self.backend, verbose=0)
+        self.thread.worker.start()
+
+    def wait(self, seconds):
+        """Runs GUI event loop (queued updates, scroll timer)"""
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            self.app.processEvents()
+            time.sleep(0.01)
+
+    def stop(self):
+        """Stops worker and releases Qt objects before interpreter exit"""
+        self.thread.worker.stop()
+        if self.backend.timer is not None:
+            self.backend.timer.stop()
+        for view in self.views:
+            view.close()
+            view.deleteLater()
+        self.views = []
+        self.app.processEvents()
+
+
+@pytest.mark.skipif(not DURATION, reason="NEUROPY3_SOAK not set")
+def test_memory_is_stable():
+    try:
+        gui = GUI()
+    except ImportError:
+        gui = None
+    tracer = Tracer()
+    recorder = Recorder(verbose=0)
+    for name in ('raw', 'attention', 'meditation', 'eeg'):
+        recorder.add(name, open(os.devnull, 'w'))
+    stages = Pipeline(parse(PIPELINE), verbose=0, tracer=tracer)
+    speed = float(SPEED) if SPEED else None
+    mw = MindWave(autostart=False, verbose=0, cache=False,
+                  transport=SyntheticTransport(speed), tracer=tracer)
+    raw = 0
+
+    def count(value):
+        nonlocal raw
+        raw += 1
+        if gui is not None:
+            gui.thread.send_raw(value)
+
+    mw.set_callback('raw', count)
+    if gui is not None:
+        mw.set_callback('eeg', gui.thread.send_eeg)
+    mw.add_sink(recorder)
+    mw.add_sink(stages)
+    wait = gui.wait if gui is not None else time.sleep
+    recorder.start()
+    stages.start()
+    mw.start()
+    samples = []
+    try:
+        wait(WARMUP)
+        # Tracer keeps its latest spans, filled slower if GUI is running
+        start = time.monotonic()
+        while (len(tracer.spans) < tracer.spans.maxlen
+               and time.monotonic() - start < 10 * WARMUP):
+            wait(1)
+        start = time.monotonic()
+        while time.monotonic() - start < DURATION:
+            samples.append((raw, rss(), objects()))
+            wait(INTERVAL)
+        samples.append((raw, rss(), objects()))
+    finally:
+        mw.stop()
+        if gui is not None:
+            gui.stop()
+        stages.stop()
+        recorder.stop()
+    first, last = samples[0], samples[-1]
+    assert last[0] > first[0], "No values replayed"
+    assert last[1] - first[1] <= MAX_RSS, (
+        f"RSS grew {(last[1] - first[1]) / 2**20:.1f}MiB")
+    assert last[2] - first[2] <= MAX_OBJECTS * first[2], (
+        f"Objects grew from {first[2]} to {last[2]}")